@@ -0,0 +1,72 @@
+"""
+Gunicorn configuration for the invite app.
+
+Run with:
+
+    gunicorn -c gunicorn.conf.py invite_app:application
+
+Each worker process serves requests on a pool of threads, so a slow
+request (or SMTP send) only ties up one thread. SQLite connections,
+the SMTP pool and the email worker are all per process, and sessions
+are stored in the database, so any worker can serve any guest.
+
+Send SIGHUP to the master to reload the code gracefully: new workers
+are started and the old ones finish their in-flight requests first.
+"""
+
+import os
+import sys
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", "5"))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+# Recycle workers now and then to bound memory growth; 0 disables it
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+
+
+def on_starting(server):
+    """Migrate the database once, before any worker starts."""
+    import invite_app
+
+    invite_app.prepare_app()
+    # No worker is running yet, so any blast still marked running was
+    # interrupted; let the first worker to start resume it.
+    invite_app.release_invite_blasts()
+    invite_app.close_db_connections()
+    # Workers import the app themselves, so a reload picks up new code
+    del sys.modules["invite_app"]
+
+
+def on_reload(server):
+    """Migrate the database for the new code before SIGHUP starts workers."""
+    import invite_app
+
+    # migrate_db() is idempotent and serialized through user_version.
+    # The old workers are still serving, so running blasts are left
+    # alone here.
+    invite_app.prepare_app()
+    invite_app.close_db_connections()
+    del sys.modules["invite_app"]
+
+
+def post_worker_init(worker):
+    """Warm caches and start the background workers in each worker process."""
+    import invite_app
+
+    invite_app.preload_static_assets()
+    # Loads the bytecode the master cached in on_starting
+    invite_app.precompile_templates()
+    invite_app.start_background_workers()
+
+
+def worker_exit(server, worker):
+    """Let the email worker finish its batch and close connections."""
+    import invite_app
+
+    invite_app.shutdown_background_workers()
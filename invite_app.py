@@ -12,8 +12,8 @@ templating) to remain installable without internet access. A small
 session manager keeps track of logged‑in users via cookies. When
 deployed to AWS (for example on an EC2 instance or via Elastic
 Beanstalk), you would typically replace the SQLite backend with a more
-durable store (like Amazon RDS or DynamoDB), and the in‑memory session
-store with a distributed solution (like ElastiCache). Authentication
+durable store (like Amazon RDS or DynamoDB), and the SQLite session
+table with a distributed solution (like ElastiCache). Authentication
 could also be offloaded to Amazon Cognito.
 
 To run the app locally, execute this file directly:
@@ -27,16 +27,36 @@ import os
 import sqlite3
 import urllib.parse
 import http.cookies
+import gzip
 import hashlib
+import hmac
+import json
 import secrets
+import shutil
+import stat
 import time
+import threading
+import weakref
+import contextlib
+import base64
+import csv
+import io
+import asyncio
 import smtplib
+import socketserver
+import sys
+import tempfile
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.utils import formataddr
+from email.utils import formataddr, formatdate, parsedate_to_datetime
+from zoneinfo import ZoneInfo
 
-from wsgiref.simple_server import make_server
-from wsgiref.util import setup_testing_defaults
+from wsgiref.simple_server import WSGIServer, make_server
+from wsgiref.util import FileWrapper, setup_testing_defaults
 from wsgiref.headers import Headers
 
 import jinja2
@@ -116,95 +136,696 @@ SMTP_PASSWORD = os.environ.get("SMTP_PASSWORD", "")  # Your app password
 SMTP_FROM_NAME = os.environ.get("SMTP_FROM_NAME", "Event Host")
 SMTP_FROM_EMAIL = os.environ.get("SMTP_FROM_EMAIL", SMTP_USERNAME)
 
+# TEMPLATE_MODE "production" (the default) compiles each template once
+# per process and never checks it for changes again; compiled bytecode
+# is also cached on disk in TEMPLATE_CACHE_DIR (a private temp directory
+# by default), so new worker processes skip parsing. "development"
+# rechecks template files on every render so edits show up immediately.
+TEMPLATE_MODE = os.environ.get("TEMPLATE_MODE", "production").lower()
+TEMPLATE_CACHE_DIR = os.environ.get("TEMPLATE_CACHE_DIR", "")
+
+if TEMPLATE_MODE not in ("production", "development"):
+    raise ValueError(f"Unknown TEMPLATE_MODE: {TEMPLATE_MODE!r}")
+if TEMPLATE_MODE == "production":
+    if TEMPLATE_CACHE_DIR:
+        os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+    bytecode_cache = jinja2.FileSystemBytecodeCache(TEMPLATE_CACHE_DIR or None)
+else:
+    bytecode_cache = None
+
 # Create a Jinja2 environment. Autoescaping ensures that variables
 # inserted into templates are HTML‑escaped unless explicitly marked
-# safe, which protects against injection attacks.
-env = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATES_DIR), autoescape=True)
+# safe, which protects against injection attacks. Plain-text email
+# templates (.txt) are left unescaped.
+env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(TEMPLATES_DIR),
+    autoescape=jinja2.select_autoescape(("html",), default_for_string=True),
+    auto_reload=TEMPLATE_MODE == "development",
+    bytecode_cache=bytecode_cache,
+    # Keep every compiled template; there are only a handful
+    cache_size=-1,
+)
+
+# -------------------------------------------------------------------
+# Database connections
+
+# SQLite tuning applied to every connection handed out by get_db().
+# cache_size is given in KiB (SQLite's negative form) and mmap_size in
+# bytes. The busy timeout lets concurrent writers queue for the lock
+# instead of failing immediately with "database is locked".
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.environ.get("DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Each thread keeps one long-lived connection per database path. The
+# owning process ID is remembered so that a forked worker (for example
+# under a preforking server) opens its own connections rather than
+# sharing file handles inherited from the parent. Connections are also
+# tracked weakly so they can be closed together on shutdown without
+# keeping the connections of finished threads alive.
+_db_local = threading.local()
+_db_connections: "weakref.WeakSet[_PooledConnection]" = weakref.WeakSet()
+_db_connections_lock = threading.Lock()
+
+
+class _PooledConnection(sqlite3.Connection):
+    """sqlite3.Connection subclass that supports weak references."""
+
+    owner_pid: int = 0
+
+
+def _open_connection(path: str) -> sqlite3.Connection:
+    """Open a new SQLite connection with the application's pragmas set."""
+    # Each connection is only ever used by the thread that opened it;
+    # disabling the same-thread check just lets close_db_connections()
+    # close it from the main thread on shutdown.
+    conn = sqlite3.connect(
+        path,
+        timeout=DB_BUSY_TIMEOUT_MS / 1000,
+        factory=_PooledConnection,
+        check_same_thread=False,
+    )
+    conn.owner_pid = os.getpid()
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_db() -> sqlite3.Connection:
+    """Return the calling thread's pooled connection to DB_PATH.
+
+    The connection is opened on first use and reused for every later
+    request served by the same thread, so callers must not close it.
+    """
+    pid = os.getpid()
+    if getattr(_db_local, "pid", None) != pid:
+        _db_local.pid = pid
+        _db_local.connections = {}
+    conn = _db_local.connections.get(DB_PATH)
+    if conn is None:
+        conn = _open_connection(DB_PATH)
+        _db_local.connections[DB_PATH] = conn
+        with _db_connections_lock:
+            _db_connections.add(conn)
+    return conn
+
+
+def release_db() -> None:
+    """Roll back any transaction the current request left open.
+
+    Called once a request has been handled so that a handler which
+    returned early (or raised) before committing does not keep holding
+    the write lock on a pooled connection.
+    """
+    connections = getattr(_db_local, "connections", None)
+    if not connections or getattr(_db_local, "pid", None) != os.getpid():
+        return
+    for conn in connections.values():
+        if conn.in_transaction:
+            conn.rollback()
+
+
+def close_db_connections() -> None:
+    """Close every pooled connection opened by this process."""
+    pid = os.getpid()
+    with _db_connections_lock:
+        connections = [conn for conn in _db_connections if conn.owner_pid == pid]
+        _db_connections.clear()
+    for conn in connections:
+        conn.close()
+    if getattr(_db_local, "pid", None) == pid:
+        _db_local.connections = {}
+
+
+# -------------------------------------------------------------------
+# Database schema
+
+
+def _rsvp_summary_change(row: str, sign: str) -> str:
+    """Return trigger SQL adding ("+") or removing ("-") an invite's RSVP.
+
+    ``row`` is NEW or OLD. Counts follow the admin page's rules: an
+    attending guest with no adult count counts as one adult. The seed
+    row uses an upsert clause because a trigger's OR IGNORE would be
+    overridden by an outer INSERT OR REPLACE, zeroing the counts.
+    """
+    return f"""INSERT INTO event_rsvp_summary (event_id) VALUES ({row}.event_id)
+            ON CONFLICT DO NOTHING;
+            UPDATE event_rsvp_summary SET
+                attending = attending {sign} ({row}.rsvp IS 'yes'),
+                not_attending = not_attending {sign} ({row}.rsvp IS 'no'),
+                no_response = no_response {sign} ({row}.rsvp IS NOT 'yes' AND {row}.rsvp IS NOT 'no'),
+                total_adults = total_adults {sign} CASE WHEN {row}.rsvp IS 'yes'
+                    THEN COALESCE(NULLIF({row}.adults_qty, 0), 1) ELSE 0 END,
+                total_kids = total_kids {sign} CASE WHEN {row}.rsvp IS 'yes'
+                    THEN COALESCE({row}.kids_qty, 0) ELSE 0 END
+            WHERE event_id = {row}.event_id;"""
+
+
+# Recounts every event's RSVP headcounts from invites, by the same rules
+# as _rsvp_summary_change().
+_rsvp_summary_recount = """SELECT event_id,
+                   SUM(rsvp IS 'yes'),
+                   SUM(rsvp IS 'no'),
+                   SUM(rsvp IS NOT 'yes' AND rsvp IS NOT 'no'),
+                   SUM(CASE WHEN rsvp IS 'yes' THEN COALESCE(NULLIF(adults_qty, 0), 1) ELSE 0 END),
+                   SUM(CASE WHEN rsvp IS 'yes' THEN COALESCE(kids_qty, 0) ELSE 0 END)
+            FROM invites GROUP BY event_id"""
+
+# Trigger SQL refreshing a new or changed invite's sort_name and its
+# invite_search row.
+_guest_search_insert = """UPDATE invites SET sort_name = lower(COALESCE(
+                (SELECT name FROM users WHERE id = NEW.user_id), NEW.guest_name, ''))
+            WHERE id = NEW.id;
+            INSERT INTO invite_search (rowid, name, email, phone) VALUES (
+                NEW.id,
+                COALESCE((SELECT name FROM users WHERE id = NEW.user_id), NEW.guest_name, ''),
+                COALESCE((SELECT email FROM users WHERE id = NEW.user_id), NEW.guest_email, ''),
+                COALESCE(NEW.guest_phone, ''));"""
+
+# Fills invite_search from every invite.
+_guest_search_fill = """INSERT INTO invite_search (rowid, name, email, phone)
+            SELECT i.id, COALESCE(u.name, i.guest_name, ''),
+                   COALESCE(u.email, i.guest_email, ''), COALESCE(i.guest_phone, '')
+            FROM invites i LEFT JOIN users u ON u.id = i.user_id"""
+
+# Ordered schema migrations. Each entry is (version, description,
+# statements); the database's PRAGMA user_version records the last
+# version applied, and migrate_db() runs every later migration inside
+# its own transaction. Append new migrations here rather than editing
+# earlier ones, since deployed databases have already applied them.
+MIGRATIONS: list[tuple[int, str, list[str]]] = [
+    (
+        1,
+        "Create base tables",
+        [
+            """CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            is_admin BOOLEAN DEFAULT 0
+        )""",
+            """CREATE TABLE IF NOT EXISTS events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT,
+            host TEXT,
+            datetime TEXT,
+            location TEXT,
+            registry1 TEXT,
+            registry2 TEXT,
+            header_image TEXT,
+            card_theme TEXT DEFAULT 'ocean'
+        )""",
+            """CREATE TABLE IF NOT EXISTS invites (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            user_id INTEGER,
+            rsvp TEXT,
+            adults_qty INTEGER DEFAULT 1,
+            kids_qty INTEGER DEFAULT 0,
+            guest_name TEXT,
+            guest_email TEXT,
+            guest_phone TEXT,
+            dietary_restrictions TEXT,
+            is_anonymous BOOLEAN DEFAULT 0,
+            click_count INTEGER DEFAULT 0,
+            first_clicked_at REAL,
+            last_clicked_at REAL,
+            FOREIGN KEY (event_id) REFERENCES events(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )""",
+            """CREATE TABLE IF NOT EXISTS invite_clicks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            invite_id INTEGER NOT NULL,
+            event_id INTEGER NOT NULL,
+            guest_phone TEXT,
+            clicked_at REAL NOT NULL,
+            ip_address TEXT,
+            user_agent TEXT,
+            FOREIGN KEY (invite_id) REFERENCES invites(id),
+            FOREIGN KEY (event_id) REFERENCES events(id)
+        )""",
+            """CREATE TABLE IF NOT EXISTS comments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            user_id INTEGER,
+            comment TEXT NOT NULL,
+            comment_name TEXT,
+            timestamp REAL NOT NULL,
+            FOREIGN KEY (event_id) REFERENCES events(id),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )""",
+        ],
+    ),
+    (
+        2,
+        "Add lookup indexes and one invite per guest per event",
+        [
+            # Older databases may already hold duplicate anonymous invites
+            # for the same phone number. Keep the oldest row, moving its
+            # duplicates' click history onto it, before enforcing uniqueness.
+            """UPDATE invite_clicks SET invite_id = (
+                SELECT MIN(keep.id) FROM invites dup
+                JOIN invites keep ON keep.event_id = dup.event_id
+                    AND keep.guest_phone = dup.guest_phone
+                    AND keep.is_anonymous = 1
+                WHERE dup.id = invite_clicks.invite_id
+            )
+            WHERE invite_id IN (
+                SELECT id FROM invites WHERE is_anonymous = 1
+                    AND guest_phone IS NOT NULL
+            )""",
+            """DELETE FROM invites WHERE is_anonymous = 1
+            AND guest_phone IS NOT NULL
+            AND id NOT IN (
+                SELECT MIN(id) FROM invites WHERE is_anonymous = 1
+                GROUP BY event_id, guest_phone
+            )""",
+            # Registered users' RSVPs are upserted on (event_id, user_id),
+            # which needs a unique key to conflict on. Keep each
+            # user's most recent invite row so that key can exist.
+            """DELETE FROM invites WHERE user_id IS NOT NULL
+            AND id NOT IN (
+                SELECT MAX(id) FROM invites WHERE user_id IS NOT NULL
+                GROUP BY event_id, user_id
+            )""",
+            """CREATE UNIQUE INDEX IF NOT EXISTS idx_invites_event_phone
+            ON invites(event_id, guest_phone) WHERE is_anonymous = 1""",
+            """CREATE UNIQUE INDEX IF NOT EXISTS idx_invites_event_user
+            ON invites(event_id, user_id) WHERE user_id IS NOT NULL""",
+            """CREATE INDEX IF NOT EXISTS idx_invites_event
+            ON invites(event_id)""",
+            """CREATE INDEX IF NOT EXISTS idx_comments_event_timestamp
+            ON comments(event_id, timestamp)""",
+            """CREATE INDEX IF NOT EXISTS idx_invite_clicks_invite
+            ON invite_clicks(invite_id, clicked_at)""",
+            """CREATE INDEX IF NOT EXISTS idx_invite_clicks_event
+            ON invite_clicks(event_id, clicked_at)""",
+        ],
+    ),
+    (
+        3,
+        "Add outgoing email queue",
+        [
+            """CREATE TABLE IF NOT EXISTS email_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT NOT NULL,
+            to_name TEXT,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at REAL NOT NULL,
+            locked_at REAL,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            sent_at REAL
+        )""",
+            """CREATE INDEX IF NOT EXISTS idx_email_outbox_due
+            ON email_outbox(status, next_attempt_at)""",
+        ],
+    ),
+    (
+        4,
+        "Track bulk invite email sends",
+        [
+            "ALTER TABLE invites ADD COLUMN invite_emailed_at REAL",
+            """CREATE TABLE IF NOT EXISTS invite_blasts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            total INTEGER NOT NULL DEFAULT 0,
+            sent INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            last_invite_id INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL,
+            FOREIGN KEY (event_id) REFERENCES events(id)
+        )""",
+            """CREATE INDEX IF NOT EXISTS idx_invite_blasts_event
+            ON invite_blasts(event_id, status)""",
+        ],
+    ),
+    (
+        5,
+        "Persist login sessions",
+        [
+            """CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        ) WITHOUT ROWID""",
+            """CREATE INDEX IF NOT EXISTS idx_sessions_expires
+            ON sessions(expires_at)""",
+        ],
+    ),
+    (
+        6,
+        "Run guest list imports as background jobs",
+        [
+            """CREATE TABLE IF NOT EXISTS import_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            filename TEXT,
+            processed_rows INTEGER NOT NULL DEFAULT 0,
+            imported_count INTEGER NOT NULL DEFAULT 0,
+            new_count INTEGER NOT NULL DEFAULT 0,
+            updated_count INTEGER NOT NULL DEFAULT 0,
+            error_count INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL,
+            FOREIGN KEY (event_id) REFERENCES events(id)
+        )""",
+            """CREATE INDEX IF NOT EXISTS idx_import_jobs_event
+            ON import_jobs(event_id)""",
+            """CREATE TABLE IF NOT EXISTS import_job_errors (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id INTEGER NOT NULL,
+            message TEXT NOT NULL,
+            FOREIGN KEY (job_id) REFERENCES import_jobs(id)
+        )""",
+            """CREATE INDEX IF NOT EXISTS idx_import_job_errors_job
+            ON import_job_errors(job_id, id)""",
+        ],
+    ),
+    (
+        7,
+        "Roll up invite clicks by hour and day",
+        [
+            """CREATE TABLE IF NOT EXISTS click_rollups (
+            event_id INTEGER NOT NULL,
+            invite_id INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            clicks INTEGER NOT NULL DEFAULT 0,
+            new_devices INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (event_id, invite_id, bucket, bucket_start)
+        ) WITHOUT ROWID""",
+            """CREATE TABLE IF NOT EXISTS invite_devices (
+            invite_id INTEGER NOT NULL,
+            ip_address TEXT NOT NULL,
+            user_agent TEXT NOT NULL,
+            first_seen_at REAL NOT NULL,
+            PRIMARY KEY (invite_id, ip_address, user_agent)
+        ) WITHOUT ROWID""",
+            # Backfill from the clicks recorded so far
+            """INSERT OR IGNORE INTO invite_devices
+            (invite_id, ip_address, user_agent, first_seen_at)
+            SELECT invite_id, COALESCE(ip_address, ''), COALESCE(user_agent, ''),
+                   MIN(clicked_at)
+            FROM invite_clicks GROUP BY 1, 2, 3""",
+            *[
+                statement
+                for bucket, seconds in (("hour", 3600), ("day", 86400))
+                for statement in (
+                    f"""INSERT INTO click_rollups
+                    (event_id, invite_id, bucket, bucket_start, clicks)
+                    SELECT event_id, invite_id, '{bucket}',
+                           CAST(clicked_at / {seconds} AS INTEGER) * {seconds}, COUNT(*)
+                    FROM invite_clicks GROUP BY 1, 2, 4""",
+                    f"""INSERT INTO click_rollups
+                    (event_id, invite_id, bucket, bucket_start, clicks)
+                    SELECT event_id, 0, '{bucket}',
+                           CAST(clicked_at / {seconds} AS INTEGER) * {seconds}, COUNT(*)
+                    FROM invite_clicks GROUP BY 1, 4""",
+                    f"""INSERT INTO click_rollups
+                    (event_id, invite_id, bucket, bucket_start, new_devices)
+                    SELECT i.event_id, d.invite_id, '{bucket}',
+                           CAST(d.first_seen_at / {seconds} AS INTEGER) * {seconds}, COUNT(*)
+                    FROM invite_devices d JOIN invites i ON i.id = d.invite_id
+                    GROUP BY 1, 2, 4
+                    ON CONFLICT(event_id, invite_id, bucket, bucket_start)
+                    DO UPDATE SET new_devices = excluded.new_devices""",
+                    f"""INSERT INTO click_rollups
+                    (event_id, invite_id, bucket, bucket_start, new_devices)
+                    SELECT i.event_id, 0, '{bucket}',
+                           CAST(d.first_seen_at / {seconds} AS INTEGER) * {seconds}, COUNT(*)
+                    FROM invite_devices d JOIN invites i ON i.id = d.invite_id
+                    GROUP BY 1, 4
+                    ON CONFLICT(event_id, invite_id, bucket, bucket_start)
+                    DO UPDATE SET new_devices = excluded.new_devices""",
+                )
+            ],
+        ],
+    ),
+    (
+        8,
+        "Keep per-event RSVP headcounts",
+        [
+            """CREATE TABLE IF NOT EXISTS event_rsvp_summary (
+            event_id INTEGER PRIMARY KEY,
+            attending INTEGER NOT NULL DEFAULT 0,
+            not_attending INTEGER NOT NULL DEFAULT 0,
+            no_response INTEGER NOT NULL DEFAULT 0,
+            total_adults INTEGER NOT NULL DEFAULT 0,
+            total_kids INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (event_id) REFERENCES events(id)
+        )""",
+            """INSERT INTO event_rsvp_summary
+            (event_id, attending, not_attending, no_response, total_adults, total_kids)
+            SELECT event_id,
+                   SUM(rsvp IS 'yes'),
+                   SUM(rsvp IS 'no'),
+                   SUM(rsvp IS NOT 'yes' AND rsvp IS NOT 'no'),
+                   SUM(CASE WHEN rsvp IS 'yes' THEN COALESCE(NULLIF(adults_qty, 0), 1) ELSE 0 END),
+                   SUM(CASE WHEN rsvp IS 'yes' THEN COALESCE(kids_qty, 0) ELSE 0 END)
+            FROM invites GROUP BY event_id""",
+            # Trigger bodies are spelled out rather than built with
+            # _rsvp_summary_change() so this migration stays as applied;
+            # migration 13 replaces them
+            """CREATE TRIGGER IF NOT EXISTS invites_rsvp_summary_insert
+            AFTER INSERT ON invites BEGIN
+            INSERT OR IGNORE INTO event_rsvp_summary (event_id) VALUES (NEW.event_id);
+            UPDATE event_rsvp_summary SET
+                attending = attending + (NEW.rsvp IS 'yes'),
+                not_attending = not_attending + (NEW.rsvp IS 'no'),
+                no_response = no_response + (NEW.rsvp IS NOT 'yes' AND NEW.rsvp IS NOT 'no'),
+                total_adults = total_adults + CASE WHEN NEW.rsvp IS 'yes'
+                    THEN COALESCE(NULLIF(NEW.adults_qty, 0), 1) ELSE 0 END,
+                total_kids = total_kids + CASE WHEN NEW.rsvp IS 'yes'
+                    THEN COALESCE(NEW.kids_qty, 0) ELSE 0 END
+            WHERE event_id = NEW.event_id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS invites_rsvp_summary_delete
+            AFTER DELETE ON invites BEGIN
+            INSERT OR IGNORE INTO event_rsvp_summary (event_id) VALUES (OLD.event_id);
+            UPDATE event_rsvp_summary SET
+                attending = attending - (OLD.rsvp IS 'yes'),
+                not_attending = not_attending - (OLD.rsvp IS 'no'),
+                no_response = no_response - (OLD.rsvp IS NOT 'yes' AND OLD.rsvp IS NOT 'no'),
+                total_adults = total_adults - CASE WHEN OLD.rsvp IS 'yes'
+                    THEN COALESCE(NULLIF(OLD.adults_qty, 0), 1) ELSE 0 END,
+                total_kids = total_kids - CASE WHEN OLD.rsvp IS 'yes'
+                    THEN COALESCE(OLD.kids_qty, 0) ELSE 0 END
+            WHERE event_id = OLD.event_id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS invites_rsvp_summary_update
+            AFTER UPDATE OF event_id, rsvp, adults_qty, kids_qty ON invites BEGIN
+            INSERT OR IGNORE INTO event_rsvp_summary (event_id) VALUES (OLD.event_id);
+            UPDATE event_rsvp_summary SET
+                attending = attending - (OLD.rsvp IS 'yes'),
+                not_attending = not_attending - (OLD.rsvp IS 'no'),
+                no_response = no_response - (OLD.rsvp IS NOT 'yes' AND OLD.rsvp IS NOT 'no'),
+                total_adults = total_adults - CASE WHEN OLD.rsvp IS 'yes'
+                    THEN COALESCE(NULLIF(OLD.adults_qty, 0), 1) ELSE 0 END,
+                total_kids = total_kids - CASE WHEN OLD.rsvp IS 'yes'
+                    THEN COALESCE(OLD.kids_qty, 0) ELSE 0 END
+            WHERE event_id = OLD.event_id;
+            INSERT OR IGNORE INTO event_rsvp_summary (event_id) VALUES (NEW.event_id);
+            UPDATE event_rsvp_summary SET
+                attending = attending + (NEW.rsvp IS 'yes'),
+                not_attending = not_attending + (NEW.rsvp IS 'no'),
+                no_response = no_response + (NEW.rsvp IS NOT 'yes' AND NEW.rsvp IS NOT 'no'),
+                total_adults = total_adults + CASE WHEN NEW.rsvp IS 'yes'
+                    THEN COALESCE(NULLIF(NEW.adults_qty, 0), 1) ELSE 0 END,
+                total_kids = total_kids + CASE WHEN NEW.rsvp IS 'yes'
+                    THEN COALESCE(NEW.kids_qty, 0) ELSE 0 END
+            WHERE event_id = NEW.event_id;
+            END""",
+        ],
+    ),
+    (
+        9,
+        "Index the guest list for paging and search",
+        [
+            # Guests are listed by name; a registered guest's name lives on
+            # users, so it is copied into sort_name for the index to cover
+            "ALTER TABLE invites ADD COLUMN sort_name TEXT NOT NULL DEFAULT ''",
+            """UPDATE invites SET sort_name = lower(COALESCE(
+                (SELECT name FROM users WHERE users.id = invites.user_id), guest_name, ''))""",
+            """CREATE INDEX IF NOT EXISTS idx_invites_event_sort
+            ON invites(event_id, sort_name, id)""",
+            # Trigram tokens let any 3+ character fragment of a name,
+            # email or phone number be found through the index
+            """CREATE VIRTUAL TABLE IF NOT EXISTS invite_search
+            USING fts5(name, email, phone, tokenize='trigram')""",
+            _guest_search_fill,
+            f"""CREATE TRIGGER IF NOT EXISTS invites_guest_search_insert
+            AFTER INSERT ON invites BEGIN
+            {_guest_search_insert}
+            END""",
+            f"""CREATE TRIGGER IF NOT EXISTS invites_guest_search_update
+            AFTER UPDATE OF guest_name, guest_email, guest_phone, user_id ON invites BEGIN
+            DELETE FROM invite_search WHERE rowid = OLD.id;
+            {_guest_search_insert}
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS invites_guest_search_delete
+            AFTER DELETE ON invites BEGIN
+            DELETE FROM invite_search WHERE rowid = OLD.id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS users_guest_search_update
+            AFTER UPDATE OF name, email ON users BEGIN
+            UPDATE invites SET sort_name = lower(COALESCE(NEW.name, guest_name, ''))
+            WHERE user_id = NEW.id;
+            UPDATE invite_search SET name = COALESCE(NEW.name, ''), email = COALESCE(NEW.email, '')
+            WHERE rowid IN (SELECT id FROM invites WHERE user_id = NEW.id);
+            END""",
+        ],
+    ),
+    (
+        10,
+        "Track event revisions",
+        [
+            # version is bumped on every edit, so anything derived from an
+            # event (calendar files, feeds) can be cached per revision
+            "ALTER TABLE events ADD COLUMN version INTEGER NOT NULL DEFAULT 1",
+            "ALTER TABLE events ADD COLUMN updated_at TIMESTAMP",
+            "UPDATE events SET updated_at = CURRENT_TIMESTAMP",
+            """CREATE TRIGGER IF NOT EXISTS events_revision_insert
+            AFTER INSERT ON events WHEN NEW.updated_at IS NULL BEGIN
+            UPDATE events SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
+            END""",
+            """CREATE TRIGGER IF NOT EXISTS events_revision_update
+            AFTER UPDATE OF title, description, host, datetime, location,
+                registry1, registry2, header_image, card_theme ON events BEGIN
+            UPDATE events SET version = OLD.version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = NEW.id;
+            END""",
+        ],
+    ),
+    (
+        11,
+        "Add private calendar feed tokens",
+        [
+            "ALTER TABLE users ADD COLUMN calendar_token TEXT",
+            """CREATE UNIQUE INDEX IF NOT EXISTS idx_users_calendar_token
+            ON users(calendar_token)""",
+        ],
+    ),
+    (
+        12,
+        "Store plain-text email bodies",
+        ["ALTER TABLE email_outbox ADD COLUMN text_body TEXT"],
+    ),
+    (
+        13,
+        "Recount RSVP headcounts corrupted by replaced invites",
+        [
+            # Recreate the triggers with the ON CONFLICT DO NOTHING seed row
+            "DROP TRIGGER IF EXISTS invites_rsvp_summary_insert",
+            "DROP TRIGGER IF EXISTS invites_rsvp_summary_delete",
+            "DROP TRIGGER IF EXISTS invites_rsvp_summary_update",
+            f"""CREATE TRIGGER invites_rsvp_summary_insert
+            AFTER INSERT ON invites BEGIN
+            {_rsvp_summary_change("NEW", "+")}
+            END""",
+            f"""CREATE TRIGGER invites_rsvp_summary_delete
+            AFTER DELETE ON invites BEGIN
+            {_rsvp_summary_change("OLD", "-")}
+            END""",
+            f"""CREATE TRIGGER invites_rsvp_summary_update
+            AFTER UPDATE OF event_id, rsvp, adults_qty, kids_qty ON invites BEGIN
+            {_rsvp_summary_change("OLD", "-")}
+            {_rsvp_summary_change("NEW", "+")}
+            END""",
+            "DELETE FROM event_rsvp_summary",
+            f"""INSERT INTO event_rsvp_summary
+            (event_id, attending, not_attending, no_response, total_adults, total_kids)
+            {_rsvp_summary_recount}""",
+        ],
+    ),
+    (
+        14,
+        "Rebuild the guest search index without replaced invites",
+        [
+            # Invites replaced by INSERT OR REPLACE left their search rows
+            # behind; rebuild from invites rather than hunt for them
+            "DELETE FROM invite_search",
+            _guest_search_fill,
+            "INSERT INTO invite_search (invite_search) VALUES ('optimize')",
+        ],
+    ),
+    (
+        15,
+        "Share page cache generations between processes",
+        [
+            # Not one of the columns the revision trigger watches, so
+            # invalidating cached pages does not bump events.version
+            "ALTER TABLE events ADD COLUMN page_generation INTEGER NOT NULL DEFAULT 0",
+        ],
+    ),
+    (
+        16,
+        "Track in-flight invite emails separately from delivered ones",
+        [
+            "ALTER TABLE invites ADD COLUMN invite_claimed_at REAL",
+        ],
+    ),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the last migration version applied to the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate_db(conn: sqlite3.Connection) -> int:
+    """Apply any pending migrations and return the resulting version."""
+    version = get_schema_version(conn)
+    for target, description, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        print(f"[DB] Applying migration {target}: {description}")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Another worker may have migrated while we waited for the lock
+            if get_schema_version(conn) >= target:
+                conn.rollback()
+                version = get_schema_version(conn)
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+    return version
 
-# In‑memory session store. This dict maps a random session ID to a
-# user ID. Because it is not persisted, sessions will be lost when
-# the process restarts. Replace with a persistent session mechanism
-# (e.g. Redis) in production.
-sessions: dict[str, int] = {}
 
 # -------------------------------------------------------------------
 # Database initialization
 
 
 def init_db() -> None:
-    """Create the database and default records if they do not exist."""
-    conn = sqlite3.connect(DB_PATH)
+    """Create or upgrade the database and add default records."""
+    conn = get_db()
+    migrate_db(conn)
     c = conn.cursor()
-    # Create tables
-    c.execute(
-        """CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        email TEXT UNIQUE NOT NULL,
-        password_hash TEXT NOT NULL,
-        is_admin BOOLEAN DEFAULT 0
-    )"""
-    )
-    c.execute(
-        """CREATE TABLE IF NOT EXISTS events (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        description TEXT,
-        host TEXT,
-        datetime TEXT,
-        location TEXT,
-        registry1 TEXT,
-        registry2 TEXT,
-        header_image TEXT,
-        card_theme TEXT DEFAULT 'ocean'
-    )"""
-    )
-    c.execute(
-        """CREATE TABLE IF NOT EXISTS invites (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        event_id INTEGER NOT NULL,
-        user_id INTEGER,
-        rsvp TEXT,
-        adults_qty INTEGER DEFAULT 1,
-        kids_qty INTEGER DEFAULT 0,
-        guest_name TEXT,
-        guest_email TEXT,
-        guest_phone TEXT,
-        dietary_restrictions TEXT,
-        is_anonymous BOOLEAN DEFAULT 0,
-        click_count INTEGER DEFAULT 0,
-        first_clicked_at REAL,
-        last_clicked_at REAL,
-        FOREIGN KEY (event_id) REFERENCES events(id),
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )"""
-    )
-    c.execute(
-        """CREATE TABLE IF NOT EXISTS invite_clicks (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        invite_id INTEGER NOT NULL,
-        event_id INTEGER NOT NULL,
-        guest_phone TEXT,
-        clicked_at REAL NOT NULL,
-        ip_address TEXT,
-        user_agent TEXT,
-        FOREIGN KEY (invite_id) REFERENCES invites(id),
-        FOREIGN KEY (event_id) REFERENCES events(id)
-    )"""
-    )
-    c.execute(
-        """CREATE TABLE IF NOT EXISTS comments (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        event_id INTEGER NOT NULL,
-        user_id INTEGER,
-        comment TEXT NOT NULL,
-        comment_name TEXT,
-        timestamp REAL NOT NULL,
-        FOREIGN KEY (event_id) REFERENCES events(id),
-        FOREIGN KEY (user_id) REFERENCES users(id)
-    )"""
-    )
-    conn.commit()
 
     # Create a default event if none exist. This initial invitation can be
     # customised later via database edits or by extending the application.
@@ -228,7 +849,140 @@ def init_db() -> None:
             ),
         )
         conn.commit()
-    conn.close()
+
+
+# -------------------------------------------------------------------
+# Sessions
+
+# SESSION_BACKEND selects where logins live. "sqlite" (the default)
+# stores a hash of each session token in the sessions table, so logins
+# survive restarts and are shared by every worker process; a small
+# per-process LRU in front of it keeps repeat lookups off the database.
+# Cached entries are rechecked after SESSION_CACHE_TTL_SECONDS, which
+# bounds how long another worker keeps honouring a session after logout.
+# "cookie" keeps no server-side state at all: the cookie carries the
+# user ID and expiry, signed with SESSION_SECRET. Signed cookies cannot
+# be revoked before they expire, and SESSION_SECRET is required and must
+# be the same in every process that should accept them.
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "sqlite").lower()
+SESSION_SECRET = os.environ.get("SESSION_SECRET", "")
+SESSION_MAX_AGE_SECONDS = int(os.environ.get("SESSION_MAX_AGE_SECONDS", str(30 * 24 * 3600)))
+SESSION_CACHE_SIZE = int(os.environ.get("SESSION_CACHE_SIZE", "1024"))
+SESSION_CACHE_TTL_SECONDS = float(os.environ.get("SESSION_CACHE_TTL_SECONDS", "60"))
+
+if SESSION_BACKEND not in ("sqlite", "cookie"):
+    raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND!r}")
+if SESSION_BACKEND == "cookie" and not SESSION_SECRET:
+    # A per-process random secret would make each worker reject the
+    # others' cookies and sign everyone out on every restart
+    raise ValueError("SESSION_BACKEND=cookie requires SESSION_SECRET to be set")
+
+# Maps token hash -> (user ID, session expiry, time to recheck the DB)
+_session_cache: OrderedDict[str, tuple[int, float, float]] = OrderedDict()
+_session_cache_lock = threading.Lock()
+
+
+def _session_key(token: str) -> str:
+    """Return the value stored for a token, so the DB never holds live tokens."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _sign_session(payload: str) -> str:
+    return hmac.new(
+        SESSION_SECRET.encode("utf-8"), payload.encode("utf-8"), hashlib.sha256
+    ).hexdigest()
+
+
+def _cache_session(key: str, user_id: int, expires_at: float) -> None:
+    if SESSION_CACHE_SIZE <= 0:
+        return
+    with _session_cache_lock:
+        _session_cache[key] = (
+            user_id,
+            expires_at,
+            time.monotonic() + SESSION_CACHE_TTL_SECONDS,
+        )
+        _session_cache.move_to_end(key)
+        while len(_session_cache) > SESSION_CACHE_SIZE:
+            _session_cache.popitem(last=False)
+
+
+def create_session(user_id: int) -> str:
+    """Start a session for a user and return the cookie value."""
+    now = time.time()
+    expires_at = int(now + SESSION_MAX_AGE_SECONDS)
+    if SESSION_BACKEND == "cookie":
+        payload = f"{user_id}.{expires_at}"
+        return f"{payload}.{_sign_session(payload)}"
+    token = secrets.token_urlsafe(32)
+    key = _session_key(token)
+    conn = get_db()
+    with conn:
+        # Piggyback cleanup of expired rows on logins
+        conn.execute("DELETE FROM sessions WHERE expires_at < ?", (now,))
+        conn.execute(
+            "INSERT INTO sessions (id, user_id, created_at, expires_at) VALUES (?,?,?,?)",
+            (key, user_id, now, expires_at),
+        )
+    _cache_session(key, user_id, expires_at)
+    return token
+
+
+def get_session_user(token: str) -> int | None:
+    """Return the user ID for a session cookie value, or None if invalid."""
+    if not token:
+        return None
+    now = time.time()
+    if SESSION_BACKEND == "cookie":
+        try:
+            user_id, expires_at, signature = token.split(".")
+            if not hmac.compare_digest(signature, _sign_session(f"{user_id}.{expires_at}")):
+                return None
+            if int(expires_at) < now:
+                return None
+            return int(user_id)
+        except ValueError:
+            return None
+    key = _session_key(token)
+    with _session_cache_lock:
+        entry = _session_cache.get(key)
+        if entry is not None:
+            user_id, expires_at, recheck_at = entry
+            if expires_at >= now and recheck_at >= time.monotonic():
+                _session_cache.move_to_end(key)
+                return user_id
+            del _session_cache[key]
+    row = get_db().execute(
+        "SELECT user_id, expires_at FROM sessions WHERE id=? AND expires_at >= ?",
+        (key, now),
+    ).fetchone()
+    if row is None:
+        return None
+    _cache_session(key, row[0], row[1])
+    return row[0]
+
+
+def delete_session(token: str) -> None:
+    """End a session. Signed cookie sessions simply lapse when cleared."""
+    if SESSION_BACKEND == "cookie" or not token:
+        return
+    key = _session_key(token)
+    with _session_cache_lock:
+        _session_cache.pop(key, None)
+    conn = get_db()
+    with conn:
+        conn.execute("DELETE FROM sessions WHERE id=?", (key,))
+
+
+def session_cookie(token: str) -> str:
+    """Return a Set-Cookie value carrying a session token."""
+    cookie = http.cookies.SimpleCookie()
+    cookie["session_id"] = token
+    cookie["session_id"]["path"] = "/"
+    cookie["session_id"]["max-age"] = SESSION_MAX_AGE_SECONDS
+    cookie["session_id"]["httponly"] = True
+    cookie["session_id"]["samesite"] = "Lax"
+    return cookie.output(header="")
 
 
 # -------------------------------------------------------------------
@@ -239,10 +993,9 @@ def get_user_from_session(environ) -> int | None:
     """Return the user ID associated with the session cookie, if any."""
     cookie_header = environ.get("HTTP_COOKIE", "")
     cookies = http.cookies.SimpleCookie(cookie_header)
-    session_cookie = cookies.get("session_id")
-    if session_cookie:
-        sid = session_cookie.value
-        return sessions.get(sid)
+    current = cookies.get("session_id")
+    if current:
+        return get_session_user(current.value)
     return None
 
 
@@ -251,6 +1004,15 @@ def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode("utf-8")).hexdigest()
 
 
+def etag_matches(environ, etag: str) -> bool:
+    """Return True if the request's If-None-Match covers ``etag``."""
+    if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
 def parse_post(environ) -> dict[str, str]:
     """Parse URL‑encoded POST data from the request body into a dict."""
     try:
@@ -263,6 +1025,150 @@ def parse_post(environ) -> dict[str, str]:
     return {k: v[0] for k, v in params.items()}
 
 
+# Uploads are parsed incrementally: the body is read MULTIPART_CHUNK_SIZE
+# bytes at a time and each part is exposed as a stream, so a large CSV
+# can be fed to csv.DictReader without ever being held in memory.
+MULTIPART_CHUNK_SIZE = 64 * 1024
+MULTIPART_MAX_HEADER_BYTES = 16 * 1024
+
+
+def _header_params(name: str, value: str) -> tuple[str, dict[str, str]]:
+    """Split a header such as Content-Disposition into value and params."""
+    message = Message()
+    message[name] = value
+    params = message.get_params(header=name) or [("", "")]
+    return params[0][0].lower(), {k.lower(): v for k, v in params[1:]}
+
+
+class MultipartPart(io.RawIOBase):
+    """The body of one multipart/form-data part, read up to its boundary."""
+
+    def __init__(self, reader: "MultipartReader", headers: dict[str, str]):
+        self._reader = reader
+        self.headers = headers
+        _, params = _header_params(
+            "Content-Disposition", headers.get("content-disposition", "")
+        )
+        self.name = params.get("name", "")
+        self.filename = params.get("filename")
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._done:
+            return 0
+        data = self._reader._read_part(len(buffer))
+        if not data:
+            self._done = True
+            return 0
+        buffer[: len(data)] = data
+        return len(data)
+
+    def drain(self) -> None:
+        """Skip whatever is left of this part."""
+        while self.read(MULTIPART_CHUNK_SIZE):
+            pass
+
+
+class MultipartReader:
+    """Incremental multipart/form-data parser over a WSGI input stream.
+
+    Iterating yields each MultipartPart in turn; a part is only valid
+    until the next one is requested. Raises ValueError on a malformed or
+    truncated body.
+    """
+
+    def __init__(self, stream, boundary: str, content_length: int):
+        self._stream = stream
+        self._remaining = content_length
+        self._delimiter = b"\r\n--" + boundary.encode("latin-1")
+        # Treat the first boundary like the others, which follow a CRLF
+        self._buffer = bytearray(b"\r\n")
+        self._part: MultipartPart | None = None
+
+    @classmethod
+    def from_environ(cls, environ) -> "MultipartReader":
+        content_type, params = _header_params(
+            "Content-Type", environ.get("CONTENT_TYPE", "")
+        )
+        if content_type != "multipart/form-data" or not params.get("boundary"):
+            raise ValueError("Expected a multipart/form-data request")
+        try:
+            content_length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            raise ValueError("Invalid Content-Length") from None
+        return cls(environ["wsgi.input"], params["boundary"], content_length)
+
+    def _fill(self) -> bool:
+        """Read another chunk into the buffer; False at end of body."""
+        if self._remaining <= 0:
+            return False
+        chunk = self._stream.read(min(MULTIPART_CHUNK_SIZE, self._remaining))
+        if not chunk:
+            self._remaining = 0
+            return False
+        self._remaining -= len(chunk)
+        self._buffer += chunk
+        return True
+
+    def _read_part(self, size: int) -> bytes:
+        """Return up to ``size`` bytes of the current part, b"" at its end."""
+        while True:
+            index = self._buffer.find(self._delimiter)
+            if index >= 0:
+                available = index
+            else:
+                # Hold back anything that could be the start of a delimiter
+                available = len(self._buffer) - len(self._delimiter) + 1
+            if available > 0:
+                data = bytes(self._buffer[: min(size, available)])
+                del self._buffer[: len(data)]
+                return data
+            if index == 0:
+                return b""
+            if not self._fill():
+                raise ValueError("Multipart body ended inside a part")
+
+    def _read_headers(self) -> dict[str, str] | None:
+        """Consume a delimiter and the next part's headers; None at the end."""
+        while len(self._buffer) < len(self._delimiter) + 2:
+            if not self._fill():
+                raise ValueError("Multipart body ended before its closing boundary")
+        if not self._buffer.startswith(self._delimiter):
+            raise ValueError("Expected a multipart boundary")
+        del self._buffer[: len(self._delimiter)]
+        if self._buffer.startswith(b"--"):
+            return None
+        while (end := self._buffer.find(b"\r\n\r\n")) < 0:
+            if len(self._buffer) > MULTIPART_MAX_HEADER_BYTES:
+                raise ValueError("Multipart part headers are too large")
+            if not self._fill():
+                raise ValueError("Multipart body ended inside part headers")
+        lines = self._buffer[:end].decode("utf-8", errors="replace").split("\r\n")
+        del self._buffer[: end + 4]
+        headers = {}
+        # The first line is whatever followed the boundary (normally empty)
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return headers
+
+    def __iter__(self):
+        # Skip any preamble before the first boundary
+        while self._read_part(MULTIPART_CHUNK_SIZE):
+            pass
+        while True:
+            if self._part is not None:
+                self._part.drain()
+            headers = self._read_headers()
+            if headers is None:
+                return
+            self._part = MultipartPart(self, headers)
+            yield self._part
+
+
 def clean_phone_number(phone: str) -> str:
     """Clean and format phone number"""
     if not phone:
@@ -280,66 +1186,450 @@ def clean_phone_number(phone: str) -> str:
     return cleaned
 
 
-def track_invite_click(event_id: int, guest_phone: str, environ) -> None:
-    """Track when an invite link is clicked"""
-    try:
-        import time
+def get_rsvp_summary(conn: sqlite3.Connection, event_id: int) -> dict[str, int]:
+    """Return an event's RSVP headcounts, kept current by triggers."""
+    row = conn.execute(
+        """SELECT attending, not_attending, no_response, total_adults, total_kids
+           FROM event_rsvp_summary WHERE event_id=?""",
+        (event_id,),
+    ).fetchone() or (0, 0, 0, 0, 0)
+    return dict(
+        zip(
+            ("attending", "not_attending", "no_response", "total_adults", "total_kids"),
+            row,
+        )
+    )
 
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
 
-        # Find the invite record
-        c.execute(
-            "SELECT id FROM invites WHERE guest_phone=? AND event_id=? AND is_anonymous=1",
-            (guest_phone, event_id),
+def check_rsvp_summary(conn: sqlite3.Connection) -> list[int]:
+    """Return the IDs of events whose headcounts differ from a full recount."""
+    rows = conn.execute(
+        f"""WITH r (event_id, attending, not_attending, no_response, total_adults,
+                    total_kids) AS ({_rsvp_summary_recount})
+            SELECT r.event_id FROM r
+            LEFT JOIN event_rsvp_summary s ON s.event_id = r.event_id
+            WHERE s.event_id IS NULL
+               OR (s.attending, s.not_attending, s.no_response, s.total_adults, s.total_kids)
+                  IS NOT (r.attending, r.not_attending, r.no_response, r.total_adults, r.total_kids)
+            UNION
+            SELECT s.event_id FROM event_rsvp_summary s
+            WHERE (s.attending, s.not_attending, s.no_response, s.total_adults, s.total_kids)
+                  IS NOT (0, 0, 0, 0, 0)
+              AND NOT EXISTS (SELECT 1 FROM invites WHERE event_id = s.event_id)"""
+    ).fetchall()
+    return [event_id for (event_id,) in rows]
+
+
+def rebuild_rsvp_summary(conn: sqlite3.Connection) -> None:
+    """Recount every event's headcounts from the invites table."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute("DELETE FROM event_rsvp_summary")
+        conn.execute(
+            f"""INSERT INTO event_rsvp_summary
+            (event_id, attending, not_attending, no_response, total_adults, total_kids)
+            {_rsvp_summary_recount}"""
         )
-        invite_row = c.fetchone()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
-        if invite_row:
-            invite_id = invite_row[0]
-            current_time = time.time()
 
-            # Get client info
-            ip_address = environ.get("REMOTE_ADDR", "unknown")
-            user_agent = environ.get("HTTP_USER_AGENT", "unknown")
+# The admin guest list is served a page at a time, ordered by name and
+# paged with a keyset cursor over (sort_name, id) so every page is an
+# index range scan, however deep into the list it is.
+GUEST_PAGE_SIZE = int(os.environ.get("GUEST_PAGE_SIZE", "50"))
 
-            # Update invite click statistics
-            c.execute(
-                """UPDATE invites SET 
-                   click_count = click_count + 1,
-                   last_clicked_at = ?,
-                   first_clicked_at = COALESCE(first_clicked_at, ?)
-                   WHERE id = ?""",
-                (current_time, current_time, invite_id),
-            )
+GUEST_STATUS_FILTERS = {
+    "all": "",
+    "yes": " AND i.rsvp = 'yes'",
+    "no": " AND i.rsvp = 'no'",
+    "pending": " AND (i.rsvp IS NULL OR i.rsvp NOT IN ('yes', 'no'))",
+}
 
-            # Record individual click
-            c.execute(
-                """INSERT INTO invite_clicks 
-                   (invite_id, event_id, guest_phone, clicked_at, ip_address, user_agent)
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (
-                    invite_id,
-                    event_id,
-                    guest_phone,
-                    current_time,
-                    ip_address,
-                    user_agent,
-                ),
-            )
 
-            conn.commit()
+def encode_guest_cursor(sort_name: str, invite_id: int) -> str:
+    """Return an opaque cursor for the page after the given guest."""
+    payload = json.dumps([sort_name, invite_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
 
+def decode_guest_cursor(cursor: str) -> tuple[str, int]:
+    """Unpack a cursor from encode_guest_cursor(); ValueError if invalid."""
+    try:
+        sort_name, invite_id = json.loads(base64.urlsafe_b64decode(cursor))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(sort_name, str) or not isinstance(invite_id, int):
+        raise ValueError("Invalid cursor")
+    return sort_name, invite_id
+
+
+def get_guest_page(
+    conn: sqlite3.Connection,
+    event_id: int,
+    status: str = "all",
+    search: str = "",
+    cursor: str | None = None,
+    limit: int = GUEST_PAGE_SIZE,
+) -> tuple[list[dict], str | None]:
+    """Return one page of an event's guests and the cursor for the next.
+
+    ``status`` is one of GUEST_STATUS_FILTERS and ``search`` matches any
+    part of a guest's name, email or phone number. Raises ValueError for
+    an unknown status or a malformed cursor.
+    """
+    if status not in GUEST_STATUS_FILTERS:
+        raise ValueError(f"Unknown status filter: {status}")
+    sql = """SELECT i.id, i.sort_name,
+                    COALESCE(u.name, i.guest_name), COALESCE(u.email, i.guest_email),
+                    i.guest_phone, i.rsvp, i.adults_qty, i.kids_qty, i.is_anonymous,
+                    i.dietary_restrictions, COALESCE(i.click_count, 0),
+                    i.first_clicked_at, i.last_clicked_at
+             FROM invites i LEFT JOIN users u ON u.id = i.user_id
+             WHERE i.event_id = ?"""
+    params: list = [event_id]
+    if cursor:
+        sql += " AND (i.sort_name, i.id) > (?, ?)"
+        params.extend(decode_guest_cursor(cursor))
+    sql += GUEST_STATUS_FILTERS[status]
+    search = search.strip()
+    if search and not search.strip("0123456789+-(). "):
+        # Phone numbers are stored as +digits; search on the digits
+        search = "".join(c for c in search if c.isdigit()) or search
+    if len(search) >= 3:
+        sql += " AND i.id IN (SELECT rowid FROM invite_search WHERE invite_search MATCH ?)"
+        params.append('"' + search.replace('"', '""') + '"')
+    elif search:
+        # Too short for trigrams; scan this event's guests instead
+        pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        sql += """ AND (COALESCE(u.name, i.guest_name) LIKE ? ESCAPE '\\'
+                   OR COALESCE(u.email, i.guest_email) LIKE ? ESCAPE '\\'
+                   OR i.guest_phone LIKE ? ESCAPE '\\')"""
+        params.extend([pattern] * 3)
+    sql += " ORDER BY i.sort_name, i.id LIMIT ?"
+    params.append(limit + 1)
+    rows = conn.execute(sql, params).fetchall()
+
+    guests = []
+    for (
+        invite_id,
+        _,
+        name,
+        email,
+        phone,
+        rsvp,
+        adults_qty,
+        kids_qty,
+        is_anonymous,
+        dietary_restrictions,
+        click_count,
+        first_clicked_at,
+        last_clicked_at,
+    ) in rows[:limit]:
+        guests.append(
+            {
+                "id": invite_id,
+                "name": name or "Anonymous",
+                "email": email or "",
+                "phone": phone or "",
+                "rsvp": rsvp,
+                "adults_qty": adults_qty or 1,
+                "kids_qty": kids_qty or 0,
+                "is_anonymous": is_anonymous,
+                "dietary_restrictions": dietary_restrictions or "",
+                "click_count": click_count or 0,
+                "first_clicked_at": first_clicked_at,
+                "last_clicked_at": last_clicked_at,
+            }
+        )
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_guest_cursor(last[1], last[0])
+    return guests, next_cursor
+
+
+# Guest list exports are streamed: rows are read from a dedicated
+# connection EXPORT_BATCH_SIZE at a time and sent as they are formatted,
+# so memory stays flat however many guests an event has.
+EXPORT_BATCH_SIZE = 500
+EXPORT_FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+EXPORT_FIELDS = (
+    "invite_id",
+    "name",
+    "email",
+    "phone",
+    "rsvp",
+    "adults_qty",
+    "kids_qty",
+    "dietary_restrictions",
+    "is_anonymous",
+    "click_count",
+    "first_clicked_at",
+    "last_clicked_at",
+)
+
+
+def _export_timestamp(value: float | None) -> str | None:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(value)) if value else None
+
+
+def iter_guest_export(event_id: int, fmt: str) -> Iterator[bytes]:
+    """Yield an event's guest list as CSV or JSON Lines, batch by batch."""
+    # A connection of its own: the WSGI server consumes this generator
+    # after the request's pooled connection has been released
+    conn = _open_connection(DB_PATH)
+    try:
+        cursor = conn.execute(
+            """SELECT i.id, COALESCE(u.name, i.guest_name), COALESCE(u.email, i.guest_email),
+                      i.guest_phone, i.rsvp, i.adults_qty, i.kids_qty,
+                      i.dietary_restrictions, i.is_anonymous, COALESCE(i.click_count, 0),
+                      i.first_clicked_at, i.last_clicked_at
+               FROM invites i LEFT JOIN users u ON u.id = i.user_id
+               WHERE i.event_id = ? ORDER BY i.sort_name, i.id""",
+            (event_id,),
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == "csv":
+            writer.writerow(EXPORT_FIELDS)
+            yield buffer.getvalue().encode("utf-8")
+        while rows := cursor.fetchmany(EXPORT_BATCH_SIZE):
+            buffer.seek(0)
+            buffer.truncate()
+            for row in rows:
+                row = (*row[:10], _export_timestamp(row[10]), _export_timestamp(row[11]))
+                if fmt == "csv":
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row))))
+                    buffer.write("\n")
+            yield buffer.getvalue().encode("utf-8")
+    finally:
         conn.close()
-    except Exception:
-        # Don't let click tracking errors break the app
-        pass
+
+
+# -------------------------------------------------------------------
+# Calendar
+
+# Calendar links and the ICS file depend only on an event's details, so
+# they are built once per event revision and kept in memory. Editing an
+# event bumps events.version (see migration 10), so every worker process
+# rebuilds its copy the next time it reads the event.
+CALENDAR_CACHE_MAX_EVENTS = int(os.environ.get("CALENDAR_CACHE_MAX_EVENTS", "256"))
+
+# Calendar apps use the UID to recognise an event they have already
+# imported, so it must stay the same across revisions.
+CALENDAR_UID_DOMAIN = urllib.parse.urlsplit(BASE_URL).hostname or "localhost"
+
+# Event times are stored as local wall-clock times. Set CALENDAR_TIMEZONE
+# to the IANA zone they are in (e.g. "America/Los_Angeles") to publish
+# them in UTC, so subscribers in other zones see the right time. Left
+# unset, they are published as floating times, which calendar apps show
+# unchanged in the viewer's own zone.
+CALENDAR_TIMEZONE = os.environ.get("CALENDAR_TIMEZONE", "")
+CALENDAR_ZONE = ZoneInfo(CALENDAR_TIMEZONE) if CALENDAR_TIMEZONE else None
+
+# How often subscribed calendar apps are asked to poll a feed
+CALENDAR_FEED_REFRESH_MINUTES = int(os.environ.get("CALENDAR_FEED_REFRESH_MINUTES", "60"))
+# Assembled feeds kept in memory, keyed by their ETag
+CALENDAR_FEED_CACHE_SIZE = int(os.environ.get("CALENDAR_FEED_CACHE_SIZE", "64"))
+
+# Maps event ID -> (version, calendar links)
+_calendar_cache: OrderedDict[int, tuple[int, dict[str, str]]] = OrderedDict()
+_calendar_cache_lock = threading.Lock()
+
+# Maps feed ETag -> feed body
+_calendar_feed_cache: OrderedDict[str, bytes] = OrderedDict()
+
+
+def ics_escape(text: str | None) -> str:
+    """Escape text for an iCalendar TEXT value (RFC 5545 section 3.3.11)."""
+    return (
+        (text or "")
+        .replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+        .replace("\r", "\\n")
+    )
+
+
+def ics_fold(line: str) -> str:
+    """Fold a content line into 75-octet pieces (RFC 5545 section 3.1).
+
+    Lines are split between characters, never inside a UTF-8 sequence,
+    and each continuation starts with a space.
+    """
+    if len(line.encode("utf-8")) <= 75:
+        return line
+    pieces = []
+    current = ""
+    size = 0
+    limit = 75
+    for char in line:
+        width = len(char.encode("utf-8"))
+        if size + width > limit:
+            pieces.append(current)
+            current = ""
+            size = 0
+            # Continuation lines lose one octet to the leading space
+            limit = 74
+        current += char
+        size += width
+    pieces.append(current)
+    return "\r\n ".join(pieces)
+
+
+def _ics_datetime(dt) -> str:
+    """Format an event time as a UTC or floating iCalendar DATE-TIME."""
+    import datetime
+
+    if CALENDAR_ZONE is None:
+        return dt.strftime("%Y%m%dT%H%M%S")
+    dt = dt.replace(tzinfo=CALENDAR_ZONE).astimezone(datetime.timezone.utc)
+    return dt.strftime("%Y%m%dT%H%M%SZ")
+
+
+def build_calendar(vevents: Iterable[str], name: str | None = None) -> str:
+    """Wrap VEVENT blocks in a VCALENDAR object."""
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//Send Invites//Event Calendar//EN",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+    ]
+    if name is not None:
+        lines += [
+            ics_fold(f"X-WR-CALNAME:{ics_escape(name)}"),
+            f"REFRESH-INTERVAL;VALUE=DURATION:PT{CALENDAR_FEED_REFRESH_MINUTES}M",
+            f"X-PUBLISHED-TTL:PT{CALENDAR_FEED_REFRESH_MINUTES}M",
+        ]
+    header = "\r\n".join(lines) + "\r\n"
+    return header + "".join(vevents) + "END:VCALENDAR\r\n"
+
+
+def get_calendar_links(
+    event_id: int,
+    version: int,
+    updated_at: str | None,
+    title: str,
+    description: str,
+    datetime_str: str,
+    location: str,
+) -> dict[str, str]:
+    """Return an event revision's calendar links, building them once."""
+    with _calendar_cache_lock:
+        entry = _calendar_cache.get(event_id)
+        if entry is not None and entry[0] == version:
+            _calendar_cache.move_to_end(event_id)
+            return entry[1]
+
+    links = generate_calendar_links(
+        title,
+        description,
+        datetime_str,
+        location,
+        uid=f"event-{event_id}@{CALENDAR_UID_DOMAIN}",
+        sequence=version - 1,
+        updated_at=updated_at,
+        url=f"{BASE_URL}/event/{event_id}",
+    )
+    links["etag"] = (
+        f'"{hashlib.md5(links["ics_content"].encode("utf-8")).hexdigest()[:16]}"'
+    )
+    with _calendar_cache_lock:
+        _calendar_cache[event_id] = (version, links)
+        _calendar_cache.move_to_end(event_id)
+        while len(_calendar_cache) > CALENDAR_CACHE_MAX_EVENTS:
+            _calendar_cache.popitem(last=False)
+    return links
+
+
+def get_calendar_feed(
+    conn: sqlite3.Connection, name: str, where: str, params: tuple
+) -> tuple[str, Callable[[], bytes]]:
+    """Return a feed's ETag and a function producing its body.
+
+    ``where`` filters ``events e`` (it may join other tables). The ETag
+    only needs each event's ID and version, so a poll that ends in a 304
+    never reads or formats the events themselves. Bodies are assembled
+    from the per-event VEVENT blocks cached by get_calendar_links().
+    """
+    revisions = conn.execute(
+        f"SELECT e.id, e.version FROM events e {where} ORDER BY e.id", params
+    ).fetchall()
+    key = f"{name}\n{revisions}\n{CALENDAR_TIMEZONE}\n{BASE_URL}".encode("utf-8")
+    etag = f'"{hashlib.md5(key).hexdigest()[:16]}"'
+
+    def body() -> bytes:
+        with _calendar_cache_lock:
+            cached = _calendar_feed_cache.get(etag)
+            if cached is not None:
+                _calendar_feed_cache.move_to_end(etag)
+                return cached
+        rows = conn.execute(
+            f"""SELECT e.id, e.version, e.updated_at, e.title, e.description,
+                       e.datetime, e.location
+                FROM events e {where} ORDER BY e.datetime, e.id""",
+            params,
+        ).fetchall()
+        vevents = [get_calendar_links(*row)["vevent"] for row in rows]
+        data = build_calendar(vevents, name).encode("utf-8")
+        with _calendar_cache_lock:
+            _calendar_feed_cache[etag] = data
+            _calendar_feed_cache.move_to_end(etag)
+            while len(_calendar_feed_cache) > CALENDAR_FEED_CACHE_SIZE:
+                _calendar_feed_cache.popitem(last=False)
+        return data
+
+    return etag, body
+
+
+def get_calendar_feed_token(conn: sqlite3.Connection, user_id: int) -> str:
+    """Return the secret token in a user's calendar feed URL, creating it once."""
+    row = conn.execute(
+        "SELECT calendar_token FROM users WHERE id=?", (user_id,)
+    ).fetchone()
+    if row and row[0]:
+        return row[0]
+    token = secrets.token_urlsafe(24)
+    # Another request may have created one first; keep whichever won
+    conn.execute(
+        "UPDATE users SET calendar_token=? WHERE id=? AND calendar_token IS NULL",
+        (token, user_id),
+    )
+    conn.commit()
+    return conn.execute(
+        "SELECT calendar_token FROM users WHERE id=?", (user_id,)
+    ).fetchone()[0]
+
+
+def webcal_url(path: str) -> str:
+    """Return a webcal:// URL for a path on this site."""
+    return "webcal://" + BASE_URL.split("://", 1)[-1].rstrip("/") + path
 
 
 def generate_calendar_links(
-    title: str, description: str, datetime_str: str, location: str
+    title: str,
+    description: str,
+    datetime_str: str,
+    location: str,
+    uid: str | None = None,
+    sequence: int = 0,
+    updated_at: str | None = None,
+    url: str | None = None,
 ) -> dict[str, str]:
-    """Generate calendar links for various platforms."""
+    """Generate calendar links for various platforms.
+
+    ``uid`` identifies the event to calendar apps, ``sequence`` is its
+    revision number and ``updated_at`` (UTC, as stored by SQLite) when
+    that revision was made; a random UID is used when none is given.
+    """
     import datetime
 
     try:
@@ -377,18 +1667,28 @@ def generate_calendar_links(
 
         # Apple Calendar (uses webcal protocol, but we'll use a data URL approach)
         # Create ICS format for Apple Calendar
-        ics_content = f"""BEGIN:VCALENDAR
-VERSION:2.0
-PRODID:-//Your App//EN
-BEGIN:VEVENT
-UID:{secrets.token_hex(16)}@yourdomain.com
-DTSTART:{start_time}
-DTEND:{end_time}
-SUMMARY:{title}
-DESCRIPTION:{description or ''}
-LOCATION:{location or ''}
-END:VEVENT
-END:VCALENDAR"""
+        if updated_at:
+            stamp = datetime.datetime.fromisoformat(updated_at)
+        else:
+            stamp = datetime.datetime.now(datetime.timezone.utc)
+        lines = [
+            "BEGIN:VEVENT",
+            f"UID:{uid or f'{secrets.token_hex(16)}@{CALENDAR_UID_DOMAIN}'}",
+            f"SEQUENCE:{sequence}",
+            f"DTSTAMP:{stamp.strftime('%Y%m%dT%H%M%SZ')}",
+            f"DTSTART:{_ics_datetime(dt)}",
+            f"DTEND:{_ics_datetime(dt + datetime.timedelta(hours=3))}",
+            f"SUMMARY:{ics_escape(title)}",
+        ]
+        if description:
+            lines.append(f"DESCRIPTION:{ics_escape(description)}")
+        if location:
+            lines.append(f"LOCATION:{ics_escape(location)}")
+        if url:
+            lines.append(f"URL:{url}")
+        lines.append("END:VEVENT")
+        vevent = "".join(ics_fold(line) + "\r\n" for line in lines)
+        ics_content = build_calendar([vevent])
 
         # For Apple Calendar, we'll create a downloadable ICS file
         ics_data_url = (
@@ -400,64 +1700,417 @@ END:VCALENDAR"""
             "outlook": outlook_url,
             "apple": ics_data_url,
             "ics_content": ics_content,
+            "vevent": vevent,
         }
 
     except Exception as e:
         print(f"Error generating calendar links: {e}")
-        return {"google": "", "outlook": "", "apple": "", "ics_content": ""}
+        return {"google": "", "outlook": "", "apple": "", "ics_content": "", "vevent": ""}
+
+
+# -------------------------------------------------------------------
+# SMTP session pool
+
+# Authenticated SMTP sessions are kept open and reused between messages
+# rather than paying for a TCP connect, STARTTLS and login every time.
+# SMTP_POOL_SIZE caps how many sessions (and so concurrent sends) a
+# process holds open. Idle sessions are checked with NOOP before reuse
+# and dropped after SMTP_IDLE_TIMEOUT_SECONDS, since most servers close
+# quiet connections on their own. SMTP_STARTTLS=false allows plain local
+# test servers.
+SMTP_POOL_SIZE = int(os.environ.get("SMTP_POOL_SIZE", "3"))
+SMTP_IDLE_TIMEOUT_SECONDS = float(os.environ.get("SMTP_IDLE_TIMEOUT_SECONDS", "60"))
+SMTP_TIMEOUT_SECONDS = float(os.environ.get("SMTP_TIMEOUT_SECONDS", "30"))
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "true").lower() not in (
+    "0",
+    "false",
+    "no",
+)
+
+
+class SMTPPool:
+    """A bounded pool of reusable, authenticated SMTP sessions."""
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        username: str = "",
+        password: str = "",
+        starttls: bool = True,
+        max_size: int = 3,
+        idle_timeout: float = 60.0,
+        timeout: float = 30.0,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._idle: list[tuple[smtplib.SMTP, float]] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        """Open, secure and authenticate a new session."""
+        print(f"[EMAIL] Connecting to {self.host}:{self.port}...")
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            self._discard(server)
+            raise
+        return server
+
+    @staticmethod
+    def _discard(server: smtplib.SMTP) -> None:
+        """Close a session, ignoring errors from an already-dead socket."""
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _is_alive(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> smtplib.SMTP:
+        """Return a live idle session, or a new one if none is usable."""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.idle_timeout and self._is_alive(
+                server
+            ):
+                return server
+            self._discard(server)
+        return self._connect()
+
+    @contextlib.contextmanager
+    def session(self):
+        """Borrow a session for the duration of the ``with`` block.
+
+        Blocks while all sessions are in use. A session that raised is
+        closed rather than returned to the pool.
+        """
+        with self._slots:
+            server = self._checkout()
+            try:
+                yield server
+            except Exception:
+                self._discard(server)
+                raise
+            with self._lock:
+                self._idle.append((server, time.monotonic()))
+
+    def send_message(self, msg) -> None:
+        """Send ``msg``, reconnecting once if a pooled session has dropped."""
+        try:
+            with self.session() as server:
+                server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server closed the session between the NOOP check and
+            # the send; one retry on a fresh connection is enough.
+            with self.session() as server:
+                server.send_message(msg)
+
+    def close(self) -> None:
+        """Close all idle sessions."""
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+        for server, _ in idle:
+            self._discard(server)
+
+
+_smtp_pool: SMTPPool | None = None
+_smtp_pool_pid: int | None = None
+_smtp_pool_lock = threading.Lock()
+
+
+def get_smtp_pool() -> SMTPPool:
+    """Return this process's shared SMTP pool, creating it on first use."""
+    global _smtp_pool, _smtp_pool_pid
+    with _smtp_pool_lock:
+        if _smtp_pool is None or _smtp_pool_pid != os.getpid():
+            _smtp_pool = SMTPPool(
+                SMTP_SERVER,
+                SMTP_PORT,
+                SMTP_USERNAME,
+                SMTP_PASSWORD,
+                starttls=SMTP_STARTTLS,
+                max_size=SMTP_POOL_SIZE,
+                idle_timeout=SMTP_IDLE_TIMEOUT_SECONDS,
+                timeout=SMTP_TIMEOUT_SECONDS,
+            )
+            _smtp_pool_pid = os.getpid()
+        return _smtp_pool
+
+
+def close_smtp_pool() -> None:
+    """Close the idle sessions held by this process's SMTP pool."""
+    global _smtp_pool
+    with _smtp_pool_lock:
+        pool = _smtp_pool if _smtp_pool_pid == os.getpid() else None
+        _smtp_pool = None
+    if pool is not None:
+        pool.close()
 
 
 # -------------------------------------------------------------------
 # Email functions
 
 
-def send_email(to_email: str, to_name: str, subject: str, body: str) -> bool:
-    """Send an email notification. Returns True if successful, False otherwise."""
-    print(f"[EMAIL] Attempting to send email to {to_email}")
-    print(
-        f"[EMAIL] SMTP Config - Server: '{SMTP_SERVER}', Port: {SMTP_PORT}, Username: '{SMTP_USERNAME}'"
-    )
+def build_email_message(
+    to_email: str, to_name: str, subject: str, body: str, text_body: str | None = None
+) -> MIMEMultipart:
+    """Build the MIME message for an HTML email with an optional text part."""
+    msg = MIMEMultipart("alternative")
+    msg["From"] = formataddr((SMTP_FROM_NAME, SMTP_FROM_EMAIL))
+    msg["To"] = formataddr((to_name, to_email))
+    msg["Subject"] = subject
 
-    if not SMTP_USERNAME or not SMTP_PASSWORD or not to_email:
-        print(f"[EMAIL ERROR] Missing configuration or recipient email")
-        return False
+    # Mail clients show the last part they support, so plain text goes first
+    if text_body:
+        msg.attach(MIMEText(text_body, "plain", "utf-8"))
+    html_part = MIMEText(body, "html", "utf-8")
+    msg.attach(html_part)
+    return msg
 
-    # Test DNS resolution
-    try:
-        import socket
 
-        socket.gethostbyname(SMTP_SERVER)
-        print(f"[EMAIL] DNS resolution successful for {SMTP_SERVER}")
-    except Exception as e:
-        print(f"[EMAIL ERROR] DNS resolution failed for '{SMTP_SERVER}': {e}")
-        return False
+def deliver_email(
+    to_email: str, to_name: str, subject: str, body: str, text_body: str | None = None
+) -> None:
+    """Send a single email over a pooled SMTP session, raising on failure."""
+    msg = build_email_message(to_email, to_name, subject, body, text_body)
+    get_smtp_pool().send_message(msg)
 
-    try:
-        msg = MIMEMultipart("alternative")
-        msg["From"] = formataddr((SMTP_FROM_NAME, SMTP_FROM_EMAIL))
-        msg["To"] = formataddr((to_name, to_email))
-        msg["Subject"] = subject
-
-        # Add HTML body
-        html_part = MIMEText(body, "html")
-        msg.attach(html_part)
-
-        print(f"[EMAIL] Connecting to {SMTP_SERVER}:{SMTP_PORT}...")
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30) as server:
-            print(f"[EMAIL] Connected, starting TLS...")
-            server.starttls()
-            print(f"[EMAIL] Logging in as {SMTP_USERNAME}...")
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            print(f"[EMAIL] Sending message...")
-            server.send_message(msg)
-
-        print(f"[EMAIL SUCCESS] Email sent successfully to {to_email}")
-        return True
 
-    except Exception as e:
-        print(f"[EMAIL ERROR] Failed to send email to {to_email}: {e}")
-        print(f"[EMAIL ERROR] Error type: {type(e).__name__}")
-        return False
+def render_email(name: str, **context) -> tuple[str, str]:
+    """Render ``templates/email/<name>.html`` and ``.txt``.
+
+    Returns the (html, plain text) bodies. The templates are compiled
+    once per process, so rendering is cheap enough for bulk sends.
+    """
+    html_body = env.get_template(f"email/{name}.html").render(context)
+    text_body = env.get_template(f"email/{name}.txt").render(context)
+    return html_body, text_body
+
+
+def email_configured() -> bool:
+    """Return True if SMTP credentials are available."""
+    return bool(SMTP_USERNAME and SMTP_PASSWORD)
+
+
+# -------------------------------------------------------------------
+# Email outbox
+
+# Outgoing mail is written to the email_outbox table and delivered by a
+# background worker thread, so request handlers never wait on SMTP.
+# Failed deliveries are retried with exponential backoff; after
+# EMAIL_MAX_ATTEMPTS the message is marked 'dead' and kept for review.
+EMAIL_MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_SECONDS = float(os.environ.get("EMAIL_RETRY_BASE_SECONDS", "30"))
+EMAIL_WORKER_POLL_SECONDS = float(os.environ.get("EMAIL_WORKER_POLL_SECONDS", "5"))
+EMAIL_WORKER_BATCH_SIZE = int(os.environ.get("EMAIL_WORKER_BATCH_SIZE", "20"))
+# Rows left in 'sending' longer than this (e.g. the process died mid
+# send) are handed back to the queue. Each message's lock is renewed
+# just before it is sent, so this only has to outlast a single send
+# (several SMTP round trips, each up to SMTP_TIMEOUT_SECONDS, plus one
+# reconnect), not a whole batch.
+EMAIL_SENDING_TIMEOUT_SECONDS = max(300, 8 * SMTP_TIMEOUT_SECONDS)
+
+_email_worker: threading.Thread | None = None
+_email_worker_pid: int | None = None
+_email_worker_lock = threading.Lock()
+_email_wakeup = threading.Event()
+_email_stop = threading.Event()
+
+
+def enqueue_email(
+    to_email: str, to_name: str, subject: str, body: str, text_body: str | None = None
+) -> int | None:
+    """Queue an email for background delivery and return its outbox ID.
+
+    Returns None without queueing when SMTP is not configured or there
+    is no recipient.
+    """
+    if not email_configured() or not to_email:
+        print(f"[EMAIL ERROR] Missing configuration or recipient email")
+        return None
+
+    conn = get_db()
+    now = time.time()
+    c = conn.execute(
+        """INSERT INTO email_outbox
+           (to_email, to_name, subject, body, text_body, status, attempts,
+            next_attempt_at, created_at)
+           VALUES (?, ?, ?, ?, ?, 'pending', 0, ?, ?)""",
+        (to_email, to_name, subject, body, text_body, now, now),
+    )
+    conn.commit()
+    print(f"[EMAIL] Queued email {c.lastrowid} to {to_email}")
+    start_email_worker()
+    _email_wakeup.set()
+    return c.lastrowid
+
+
+def _claim_outbox_batch(conn: sqlite3.Connection, limit: int) -> list[tuple]:
+    """Mark up to ``limit`` due messages as sending and return them."""
+    now = time.time()
+    # A stale 'sending' row was being sent when its worker died or hung,
+    # so it counts as a failed attempt. Otherwise a message that kills
+    # the worker would be retried forever.
+    conn.execute(
+        """UPDATE email_outbox SET status='dead', attempts=attempts+1,
+           last_error='Abandoned while sending'
+           WHERE status='sending' AND locked_at < ? AND attempts+1 >= ?""",
+        (now - EMAIL_SENDING_TIMEOUT_SECONDS, EMAIL_MAX_ATTEMPTS),
+    )
+    conn.execute(
+        """UPDATE email_outbox SET status='pending', attempts=attempts+1,
+           last_error='Abandoned while sending',
+           next_attempt_at=? + ? * (1 << attempts)
+           WHERE status='sending' AND locked_at < ?""",
+        (now, EMAIL_RETRY_BASE_SECONDS, now - EMAIL_SENDING_TIMEOUT_SECONDS),
+    )
+    rows = conn.execute(
+        """UPDATE email_outbox SET status='sending', locked_at=?
+           WHERE id IN (
+               SELECT id FROM email_outbox
+               WHERE status='pending' AND next_attempt_at <= ?
+               ORDER BY next_attempt_at LIMIT ?
+           )
+           RETURNING id, to_email, to_name, subject, body, text_body, attempts,
+                     locked_at""",
+        (now, now, limit),
+    ).fetchall()
+    conn.commit()
+    return rows
+
+
+def process_outbox(limit: int = EMAIL_WORKER_BATCH_SIZE) -> int:
+    """Deliver one batch of due outbox messages. Returns how many were tried."""
+    conn = get_db()
+    rows = _claim_outbox_batch(conn, limit)
+    for row in rows:
+        message_id, to_email, to_name, subject, body, text_body, attempts, locked_at = row
+        # Renew the lock before sending. If it has changed, this batch
+        # took long enough for another worker to reclaim the message.
+        renewed = conn.execute(
+            """UPDATE email_outbox SET locked_at=?
+               WHERE id=? AND status='sending' AND locked_at=?""",
+            (time.time(), message_id, locked_at),
+        ).rowcount
+        conn.commit()
+        if not renewed:
+            print(f"[EMAIL] Email {message_id} was reclaimed by another worker; skipping")
+            continue
+        attempts += 1
+        try:
+            deliver_email(to_email, to_name, subject, body, text_body)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempts >= EMAIL_MAX_ATTEMPTS:
+                print(f"[EMAIL ERROR] Giving up on email {message_id} to {to_email}: {error}")
+                conn.execute(
+                    """UPDATE email_outbox SET status='dead', attempts=?, last_error=?
+                       WHERE id=?""",
+                    (attempts, error, message_id),
+                )
+            else:
+                delay = EMAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                print(
+                    f"[EMAIL ERROR] Email {message_id} to {to_email} failed "
+                    f"(attempt {attempts}), retrying in {delay:.0f}s: {error}"
+                )
+                conn.execute(
+                    """UPDATE email_outbox SET status='pending', attempts=?,
+                       last_error=?, next_attempt_at=? WHERE id=?""",
+                    (attempts, error, time.time() + delay, message_id),
+                )
+        else:
+            print(f"[EMAIL SUCCESS] Email {message_id} sent to {to_email}")
+            conn.execute(
+                """UPDATE email_outbox SET status='sent', attempts=?, sent_at=?,
+                   last_error=NULL WHERE id=?""",
+                (attempts, time.time(), message_id),
+            )
+        conn.commit()
+    return len(rows)
+
+
+def _seconds_until_next_email(conn: sqlite3.Connection) -> float:
+    """Return how long the worker may sleep before a retry falls due."""
+    row = conn.execute(
+        "SELECT MIN(next_attempt_at) FROM email_outbox WHERE status='pending'"
+    ).fetchone()
+    if row[0] is None:
+        return EMAIL_WORKER_POLL_SECONDS
+    return max(0.0, min(EMAIL_WORKER_POLL_SECONDS, row[0] - time.time()))
+
+
+def _email_worker_loop() -> None:
+    """Drain the outbox until stop_email_worker() is called."""
+    while not _email_stop.is_set():
+        # Clear before draining so an enqueue during the batch still
+        # wakes us for another pass.
+        _email_wakeup.clear()
+        delay = EMAIL_WORKER_POLL_SECONDS
+        try:
+            if process_outbox():
+                # More may be due; go round again without sleeping
+                continue
+            delay = _seconds_until_next_email(get_db())
+        except Exception as e:
+            print(f"[EMAIL ERROR] Outbox worker error: {e}")
+        finally:
+            release_db()
+        _email_wakeup.wait(delay)
+
+
+def start_email_worker() -> None:
+    """Start this process's outbox worker thread if it is not running."""
+    global _email_worker, _email_worker_pid
+    if not email_configured():
+        return
+    with _email_worker_lock:
+        pid = os.getpid()
+        if (
+            _email_worker is not None
+            and _email_worker_pid == pid
+            and _email_worker.is_alive()
+        ):
+            return
+        _email_stop.clear()
+        _email_worker = threading.Thread(
+            target=_email_worker_loop, name="email-outbox", daemon=True
+        )
+        _email_worker_pid = pid
+        _email_worker.start()
+
+
+def stop_email_worker(timeout: float = 10.0) -> None:
+    """Ask the outbox worker to finish its current batch and exit."""
+    global _email_worker
+    with _email_worker_lock:
+        worker = _email_worker
+        _email_worker = None
+    if worker is None or _email_worker_pid != os.getpid():
+        return
+    _email_stop.set()
+    _email_wakeup.set()
+    worker.join(timeout)
 
 
 def send_rsvp_confirmation_emails(
@@ -470,8 +2123,8 @@ def send_rsvp_confirmation_emails(
     dietary_restrictions: str = "",
     is_anonymous: bool = False,
 ):
-    """Send RSVP confirmation emails to both guest and host."""
-    conn = sqlite3.connect(DB_PATH)
+    """Queue RSVP confirmation emails to both guest and host."""
+    conn = get_db()
     c = conn.cursor()
 
     # Get event details
@@ -480,7 +2133,6 @@ def send_rsvp_confirmation_emails(
     )
     event = c.fetchone()
     if not event:
-        conn.close()
         return
 
     event_title, host_name, event_datetime, location = event
@@ -490,8 +2142,6 @@ def send_rsvp_confirmation_emails(
     host_result = c.fetchone()
     host_email = host_result[0] if host_result else None
 
-    conn.close()
-
     # Format event date/time for display
     import datetime
 
@@ -515,1208 +2165,2916 @@ def send_rsvp_confirmation_emails(
         guest_message = "Thanks for letting us know. You'll be missed!"
         host_message = f"{guest_name} is unable to attend your event."
 
+    context = {
+        "event_title": event_title,
+        "host_name": host_name,
+        "date_display": date_display,
+        "time_display": time_display,
+        "location": location,
+        "guest_name": guest_name,
+        "guest_email": guest_email,
+        "rsvp": rsvp,
+        "adults_qty": adults_qty,
+        "kids_qty": kids_qty,
+        "dietary_restrictions": dietary_restrictions,
+        "is_anonymous": is_anonymous,
+        "status_text": status_text,
+        "status_emoji": status_emoji,
+        "guest_message": guest_message,
+        "host_message": host_message,
+        "admin_url": f"{BASE_URL}/admin/event/{event_id}",
+    }
+
     # Guest confirmation email
     if guest_email:
         guest_subject = f"RSVP Confirmation: {event_title}"
-        guest_body = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: 'Georgia', serif; max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .event-details {{ background: white; padding: 20px; border-radius: 5px; margin: 20px 0; border-left: 4px solid #667eea; }}
-                .status {{ font-size: 18px; font-weight: bold; color: {'#28a745' if rsvp == 'yes' else '#dc3545'}; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>{status_emoji} RSVP Confirmed</h1>
-            </div>
-            <div class="content">
-                <p>Hi {guest_name},</p>
-                <p>This confirms your RSVP for:</p>
-                
-                <div class="event-details">
-                    <h3>{event_title}</h3>
-                    <p><strong>Host:</strong> {host_name}</p>
-                    <p><strong>Date:</strong> {date_display}</p>
-                    <p><strong>Time:</strong> {time_display}</p>
-                    <p><strong>Location:</strong> {location}</p>
-                </div>
-                
-                <p class="status">Your RSVP: {status_text.title()} {status_emoji}</p>
-                
-                {f'<p><strong>Party size:</strong> {adults_qty} adult(s), {kids_qty} kid(s)</p>' if rsvp == 'yes' else ''}
-                
-                {f'<p><strong>Dietary restrictions:</strong> {dietary_restrictions}</p>' if rsvp == 'yes' and dietary_restrictions else ''}
-                
-                <p>{guest_message}</p>
-                
-                <p>Best regards,<br>{host_name}</p>
-            </div>
-        </body>
-        </html>
-        """
-
-        send_email(guest_email, guest_name, guest_subject, guest_body)
+        guest_body, guest_text = render_email("rsvp_guest", **context)
+        enqueue_email(guest_email, guest_name, guest_subject, guest_body, guest_text)
 
     # Host notification email
     if host_email:
         host_subject = f"New RSVP: {guest_name} - {event_title}"
-        host_body = f"""
-        <html>
-        <head>
-            <style>
-                body {{ font-family: 'Georgia', serif; max-width: 600px; margin: 0 auto; padding: 20px; }}
-                .header {{ background: linear-gradient(135deg, #28a745 0%, #20c997 100%); color: white; padding: 20px; text-align: center; border-radius: 10px 10px 0 0; }}
-                .content {{ background: #f9f9f9; padding: 30px; border-radius: 0 0 10px 10px; }}
-                .guest-details {{ background: white; padding: 20px; border-radius: 5px; margin: 20px 0; border-left: 4px solid #28a745; }}
-                .status {{ font-size: 18px; font-weight: bold; color: {'#28a745' if rsvp == 'yes' else '#dc3545'}; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>{status_emoji} New RSVP Received</h1>
-            </div>
-            <div class="content">
-                <p>Hi {host_name},</p>
-                <p>{host_message}</p>
-                
-                <div class="guest-details">
-                    <h3>RSVP Details</h3>
-                    <p><strong>Guest:</strong> {guest_name}</p>
-                    <p><strong>Email:</strong> {guest_email or 'Not provided'}</p>
-                    <p class="status">Status: {status_text.title()} {status_emoji}</p>
-                    {f'<p><strong>Party size:</strong> {adults_qty} adult(s), {kids_qty} kid(s)</p>' if rsvp == 'yes' else ''}
-                    {f'<p><strong>Dietary restrictions:</strong> {dietary_restrictions}</p>' if rsvp == 'yes' and dietary_restrictions else ''}
-                    <p><strong>RSVP Type:</strong> {'Anonymous' if is_anonymous else 'Account-based'}</p>
-                </div>
-                
-                <p>You can view all RSVPs in your <a href="{BASE_URL}/admin/event/{event_id}">admin panel</a>.</p>
-                
-                <p>Event: {event_title}<br>
-                Date: {date_display} at {time_display}</p>
-            </div>
-        </body>
-        </html>
-        """
-
-        send_email(host_email, host_name, host_subject, host_body)
+        host_body, host_text = render_email("rsvp_host", **context)
+        enqueue_email(host_email, host_name, host_subject, host_body, host_text)
 
 
 # -------------------------------------------------------------------
-# WSGI application
-
+# Bulk invite emails
+
+# An invite blast emails every imported guest of an event who has an
+# email address and has not been emailed yet. Guests are read in
+# batches ordered by invite ID, and the last ID finished is saved on the
+# invite_blasts row after every batch. Each guest is claimed by setting
+# invite_claimed_at just before their message is sent; invite_emailed_at
+# is only set once the message is accepted, and the claim is released if
+# sending fails. A resumed blast, or a second runner that wrongly judged
+# a slow blast stale, skips guests whose claim is still live, so nobody
+# is emailed twice. Claims left behind by a process that died mid-send
+# (at most SMTP_POOL_SIZE per blast) go stale after
+# INVITE_CLAIM_STALE_SECONDS and are retried before the blast completes;
+# such a guest may get a second copy if the dead process had already
+# handed their message to the server.
+# The blast's updated_at is bumped after every message. Messages go out
+# over the shared SMTP pool, one sender thread per pooled session, and
+# are throttled to INVITE_BLAST_RATE_PER_SECOND.
+INVITE_BLAST_BATCH_SIZE = int(os.environ.get("INVITE_BLAST_BATCH_SIZE", "100"))
+INVITE_BLAST_RATE_PER_SECOND = float(
+    os.environ.get("INVITE_BLAST_RATE_PER_SECOND", "2")
+)
+# A running blast whose row has not been updated for this long is
+# assumed to belong to a process that died, and may be resumed.
+INVITE_BLAST_STALE_SECONDS = 120
+# A guest claimed for this long without being marked as emailed is
+# assumed to have been abandoned mid-send. Covers the rate limiter wait,
+# waiting for a pooled SMTP session and the send itself.
+INVITE_CLAIM_STALE_SECONDS = EMAIL_SENDING_TIMEOUT_SECONDS
+
+_blast_threads: dict[int, threading.Thread] = {}
+_blast_threads_lock = threading.Lock()
+
+
+class RateLimiter:
+    """Thread-safe limiter that spaces calls evenly at ``rate`` per second."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        """Block until the caller may proceed."""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def build_invite_link(event_id: int, name: str, phone: str, email: str) -> str:
+    """Return a guest's prefilled anonymous RSVP link."""
+    params = {"name": name or "", "phone": phone or ""}
+    if email:
+        params["email"] = email
+    return f"{BASE_URL}/anonymous-rsvp/{event_id}?{urllib.parse.urlencode(params)}"
+
+
+def render_invite_email(
+    event: dict, guest_name: str, invite_link: str
+) -> tuple[str, str, str]:
+    """Return the (subject, html body, text body) of an invitation email."""
+    subject = f"You're invited: {event['title']}"
+    body, text_body = render_email(
+        "invite", event=event, guest_name=guest_name, invite_link=invite_link
+    )
+    return subject, body, text_body
 
-def application(environ, start_response):
-    """Handle an incoming HTTP request."""
-    setup_testing_defaults(environ)
-    path = environ.get("PATH_INFO", "")
-    method = environ.get("REQUEST_METHOD", "GET").upper()
 
-    # Serve static files under /static/ from the static directory.
-    if path.startswith("/static/"):
-        # Construct the file path relative to the application root.
-        rel_path = path.lstrip("/")
-        file_path = os.path.join(BASE_DIR, rel_path)
-        if os.path.isfile(file_path):
-            # Determine simple MIME type based on extension.
-            ext = os.path.splitext(file_path)[1].lower()
-            mime_types = {
-                ".css": "text/css",
-                ".js": "application/javascript",
-                ".png": "image/png",
-                ".jpg": "image/jpeg",
-                ".jpeg": "image/jpeg",
-                ".gif": "image/gif",
-                ".svg": "image/svg+xml",
-            }
-            content_type = mime_types.get(ext, "application/octet-stream")
-            with open(file_path, "rb") as f:
-                data = f.read()
-            headers = [
-                ("Content-Type", content_type),
-                ("Content-Length", str(len(data))),
-            ]
-            start_response("200 OK", headers)
-            return [data]
-        else:
-            start_response("404 Not Found", [("Content-Type", "text/plain")])
-            return [b"Not Found"]
+def _load_blast_event(conn: sqlite3.Connection, event_id: int) -> dict | None:
+    """Fetch the event fields used in invitation emails."""
+    row = conn.execute(
+        "SELECT title, host, datetime, location FROM events WHERE id=?", (event_id,)
+    ).fetchone()
+    if not row:
+        return None
+    title, host, datetime_str, location = row
+    import datetime
 
-    # Routing for dynamic endpoints
-    if path == "/":
-        # Redirect directly to the main event page
-        start_response("302 Found", [("Location", "/event/1")])
-        return [b""]
+    try:
+        dt = datetime.datetime.fromisoformat(datetime_str)
+        date_display = dt.strftime("%A, %B %-d, %Y")
+        time_display = dt.strftime("%-I:%M %p")
+    except Exception:
+        date_display = datetime_str or ""
+        time_display = ""
+    return {
+        "title": title,
+        "host": host,
+        "location": location,
+        "date_display": date_display,
+        "time_display": time_display,
+    }
+
+
+def run_invite_blast(blast_id: int) -> None:
+    """Send (or resume sending) the invitations for one blast."""
+
+    conn = get_db()
+    row = conn.execute(
+        "SELECT event_id, last_invite_id FROM invite_blasts WHERE id=?", (blast_id,)
+    ).fetchone()
+    if not row:
+        return
+    event_id, last_invite_id = row
+    event = _load_blast_event(conn, event_id)
+    if event is None:
+        conn.execute(
+            """UPDATE invite_blasts SET status='failed', last_error=?,
+               updated_at=?, finished_at=? WHERE id=?""",
+            ("Event not found", time.time(), time.time(), blast_id),
+        )
+        conn.commit()
+        return
 
-    if path == "/register":
-        if method == "GET":
-            template = env.get_template("register.html")
-            body = template.render(title="Register", error=None)
-            start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-            return [body.encode("utf-8")]
-        elif method == "POST":
-            params = parse_post(environ)
-            name = params.get("name", "").strip()
-            email = params.get("email", "").strip()
-            password = params.get("password", "")
-            if not (name and email and password):
-                template = env.get_template("register.html")
-                body = template.render(
-                    title="Register", error="Please fill all fields."
-                )
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            try:
-                # Check if this is the first user (make them admin)
-                c.execute("SELECT COUNT(*) FROM users")
-                user_count = c.fetchone()[0]
-                is_first_user = user_count == 0
-
-                c.execute(
-                    "INSERT INTO users (name, email, password_hash, is_admin) VALUES (?,?,?,?)",
-                    (name, email, hash_password(password), is_first_user),
-                )
-                user_id = c.lastrowid
-                # For demonstration, automatically invite the new user to the default event (ID=1)
-                c.execute(
-                    "INSERT INTO invites (event_id, user_id, rsvp) VALUES (?,?,?)",
-                    (1, user_id, None),
-                )
-                conn.commit()
-            except sqlite3.IntegrityError:
-                conn.close()
-                template = env.get_template("register.html")
-                body = template.render(
-                    title="Register", error="Email already registered."
+    limiter = RateLimiter(INVITE_BLAST_RATE_PER_SECOND)
+
+    def send_one(guest: tuple) -> tuple[str, str | None]:
+        """Send one invite; return ("sent" | "skipped" | "failed", error)."""
+        invite_id, name, email, phone = guest
+        db = get_db()
+        now = time.time()
+        with db:
+            claimed = db.execute(
+                """UPDATE invites SET invite_claimed_at=?
+                   WHERE id=? AND invite_emailed_at IS NULL
+                   AND (invite_claimed_at IS NULL OR invite_claimed_at <= ?)""",
+                (now, invite_id, now - INVITE_CLAIM_STALE_SECONDS),
+            ).rowcount
+        if not claimed:
+            return "skipped", None
+        subject, body, text_body = render_invite_email(
+            event, name, build_invite_link(event_id, name, phone, email)
+        )
+        limiter.wait()
+        try:
+            deliver_email(email, name or "", subject, body, text_body)
+        except Exception as e:
+            with db:
+                db.execute(
+                    "UPDATE invites SET invite_claimed_at=NULL WHERE id=?", (invite_id,)
                 )
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-            conn.close()
-            # Auto‑login after successful registration
-            session_id = secrets.token_hex(16)
-            sessions[session_id] = user_id
-            cookie = http.cookies.SimpleCookie()
-            cookie["session_id"] = session_id
-            cookie["session_id"]["path"] = "/"
-            headers = Headers(
-                [("Location", "/"), ("Set-Cookie", cookie.output(header=""))]
+            return "failed", f"{type(e).__name__}: {e}"
+        with db:
+            db.execute(
+                """UPDATE invites SET invite_emailed_at=?, invite_claimed_at=NULL
+                   WHERE id=?""",
+                (time.time(), invite_id),
             )
-            start_response("302 Found", headers.items())
-            return [b""]
-
-    if path == "/login":
-        if method == "GET":
-            template = env.get_template("login.html")
-            body = template.render(title="Login", error=None)
-            start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-            return [body.encode("utf-8")]
-        elif method == "POST":
-            params = parse_post(environ)
-            email = params.get("email", "").strip()
-            password = params.get("password", "")
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute("SELECT id, password_hash FROM users WHERE email=?", (email,))
-            row = c.fetchone()
-            conn.close()
-            if row and hash_password(password) == row[1]:
-                user_id = row[0]
-                session_id = secrets.token_hex(16)
-                sessions[session_id] = user_id
-                cookie = http.cookies.SimpleCookie()
-                cookie["session_id"] = session_id
-                cookie["session_id"]["path"] = "/"
-                headers = Headers(
-                    [("Location", "/"), ("Set-Cookie", cookie.output(header=""))]
-                )
-                start_response("302 Found", headers.items())
-                return [b""]
-            else:
-                template = env.get_template("login.html")
-                body = template.render(
-                    title="Login", error="Invalid email or password."
-                )
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-
-    if path == "/logout":
-        # Invalidate the session cookie
-        cookies = http.cookies.SimpleCookie(environ.get("HTTP_COOKIE", ""))
-        session_cookie = cookies.get("session_id")
-        headers = Headers([("Location", "/event/1")])
-        if session_cookie:
-            sid = session_cookie.value
-            sessions.pop(sid, None)
-            expired_cookie = http.cookies.SimpleCookie()
-            expired_cookie["session_id"] = ""
-            expired_cookie["session_id"]["path"] = "/"
-            expired_cookie["session_id"]["expires"] = "Thu, 01 Jan 1970 00:00:00 GMT"
-            headers.add_header("Set-Cookie", expired_cookie.output(header=""))
-        start_response("302 Found", headers.items())
-        return [b""]
-
-    if path.startswith("/calendar/"):
-        segments = path.strip("/").split("/")
-        if len(segments) == 2:
-            try:
-                event_id = int(segments[1])
-            except ValueError:
-                start_response("404 Not Found", [("Content-Type", "text/plain")])
-                return [b"Event not found"]
+        return "sent", None
+
+    def send_batch(guests: list[tuple]) -> None:
+        """Send a batch of invites, recording progress after each one."""
+        # map() yields results in order as each send finishes, so
+        # progress (and the heartbeat) is recorded while the rest of
+        # the batch is still going out.
+        for guest, (outcome, error) in zip(guests, executor.map(send_one, guests)):
+            last_error = None
+            if outcome == "failed":
+                last_error = f"{guest[2]}: {error}"
+                print(f"[BLAST ERROR] Invite {guest[0]} to {guest[2]} failed: {error}")
+            conn.execute(
+                """UPDATE invite_blasts SET sent=sent+?, failed=failed+?,
+                   last_error=COALESCE(?, last_error), updated_at=? WHERE id=?""",
+                (
+                    outcome == "sent",
+                    outcome == "failed",
+                    last_error,
+                    time.time(),
+                    blast_id,
+                ),
+            )
+            conn.commit()
 
-            # Fetch event details
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute(
-                """SELECT title, description, host, datetime, location FROM events WHERE id=?""",
-                (event_id,),
+    print(f"[BLAST] Sending invites for event {event_id} (blast {blast_id})")
+    with ThreadPoolExecutor(max_workers=SMTP_POOL_SIZE) as executor:
+        while True:
+            guests = conn.execute(
+                """SELECT id, guest_name, guest_email, guest_phone FROM invites
+                   WHERE event_id=? AND id>? AND is_anonymous=1
+                   AND guest_email IS NOT NULL AND guest_email != ''
+                   AND invite_emailed_at IS NULL
+                   ORDER BY id LIMIT ?""",
+                (event_id, last_invite_id, INVITE_BLAST_BATCH_SIZE),
+            ).fetchall()
+            if not guests:
+                break
+            send_batch(guests)
+            last_invite_id = guests[-1][0]
+            conn.execute(
+                """UPDATE invite_blasts SET last_invite_id=?, updated_at=?
+                   WHERE id=?""",
+                (last_invite_id, time.time(), blast_id),
             )
-            event = c.fetchone()
-            conn.close()
+            conn.commit()
 
-            if not event:
-                start_response("404 Not Found", [("Content-Type", "text/plain")])
-                return [b"Event not found"]
+        # Guests still claimed were skipped above: either another runner
+        # is sending to them, or the process that claimed them died. Wait
+        # for those claims to be resolved or go stale, then retry them.
+        while True:
+            claimed = conn.execute(
+                """SELECT id, guest_name, guest_email, guest_phone, invite_claimed_at
+                   FROM invites
+                   WHERE event_id=? AND is_anonymous=1
+                   AND guest_email IS NOT NULL AND guest_email != ''
+                   AND invite_emailed_at IS NULL AND invite_claimed_at IS NOT NULL
+                   ORDER BY id""",
+                (event_id,),
+            ).fetchall()
+            if not claimed:
+                break
+            wait = min(row[4] for row in claimed) + INVITE_CLAIM_STALE_SECONDS
+            wait -= time.time()
+            if wait > 0:
+                time.sleep(min(wait, INVITE_BLAST_STALE_SECONDS / 2))
+                conn.execute(
+                    "UPDATE invite_blasts SET updated_at=? WHERE id=?",
+                    (time.time(), blast_id),
+                )
+                conn.commit()
+                continue
+            send_batch([row[:4] for row in claimed])
 
-            title, description, host, datetime_str, location = event
-            calendar_links = generate_calendar_links(
-                title, description, datetime_str, location
-            )
+    conn.execute(
+        """UPDATE invite_blasts SET status='completed', updated_at=?, finished_at=?
+           WHERE id=?""",
+        (time.time(), time.time(), blast_id),
+    )
+    conn.commit()
+    print(f"[BLAST] Finished blast {blast_id} for event {event_id}")
 
-            # Return ICS file content
-            headers = [
-                ("Content-Type", "text/calendar; charset=utf-8"),
-                ("Content-Disposition", f'attachment; filename="event_{event_id}.ics"'),
-            ]
-            start_response("200 OK", headers)
-            return [calendar_links["ics_content"].encode("utf-8")]
 
-    if path.startswith("/event/"):
-        segments = path.strip("/").split("/")
-        if len(segments) == 2:
-            try:
-                event_id = int(segments[1])
-            except ValueError:
-                start_response("404 Not Found", [("Content-Type", "text/plain")])
-                return [b"Event not found"]
-            # Check if user is logged in (but don't require it)
-            user_id = get_user_from_session(environ)
-            if method == "GET":
-                # Fetch event details
-                conn = sqlite3.connect(DB_PATH)
-                c = conn.cursor()
-                c.execute(
-                    """SELECT title, description, host, datetime, location,
-                             registry1, registry2, header_image FROM events WHERE id=?""",
-                    (event_id,),
-                )
-                event = c.fetchone()
-                if not event:
-                    conn.close()
-                    start_response("404 Not Found", [("Content-Type", "text/plain")])
-                    return [b"Event not found"]
-                (
-                    title,
-                    description,
-                    host,
-                    datetime_str,
-                    location,
-                    reg1,
-                    reg2,
-                    header_image,
-                ) = event
-
-                # Generate calendar links
-                calendar_links = generate_calendar_links(
-                    title, description, datetime_str, location
-                )
+def _run_invite_blast_thread(blast_id: int) -> None:
+    """Thread target for run_invite_blast() that records fatal errors."""
+    try:
+        run_invite_blast(blast_id)
+    except Exception as e:
+        print(f"[BLAST ERROR] Blast {blast_id} stopped: {e}")
+        conn = get_db()
+        conn.rollback()
+        conn.execute(
+            """UPDATE invite_blasts SET status='failed', last_error=?, updated_at=?
+               WHERE id=?""",
+            (f"{type(e).__name__}: {e}", time.time(), blast_id),
+        )
+        conn.commit()
+    finally:
+        release_db()
+        with _blast_threads_lock:
+            _blast_threads.pop(blast_id, None)
+
+
+def _spawn_invite_blast(blast_id: int) -> None:
+    """Run a blast on a background thread unless it is already running here."""
+    with _blast_threads_lock:
+        thread = _blast_threads.get(blast_id)
+        if thread is not None and thread.is_alive():
+            return
+        thread = threading.Thread(
+            target=_run_invite_blast_thread,
+            args=(blast_id,),
+            name=f"invite-blast-{blast_id}",
+            daemon=True,
+        )
+        _blast_threads[blast_id] = thread
+        thread.start()
+
+
+def start_invite_blast(event_id: int) -> int:
+    """Start emailing invites for an event and return the blast ID.
+
+    If the event already has a blast in progress it is reused: resumed
+    from its checkpoint when it was left behind by a dead process, or
+    left alone when it is still being worked on.
+    """
+    conn = get_db()
+    now = time.time()
+    row = conn.execute(
+        """SELECT id, updated_at FROM invite_blasts
+           WHERE event_id=? AND status='running' ORDER BY id DESC LIMIT 1""",
+        (event_id,),
+    ).fetchone()
+    if row:
+        blast_id, updated_at = row
+        with _blast_threads_lock:
+            running_here = blast_id in _blast_threads
+        if running_here or now - updated_at < INVITE_BLAST_STALE_SECONDS:
+            return blast_id
+        conn.execute(
+            "UPDATE invite_blasts SET updated_at=? WHERE id=?", (now, blast_id)
+        )
+    else:
+        (total,) = conn.execute(
+            """SELECT COUNT(*) FROM invites WHERE event_id=? AND is_anonymous=1
+               AND guest_email IS NOT NULL AND guest_email != ''
+               AND invite_emailed_at IS NULL""",
+            (event_id,),
+        ).fetchone()
+        c = conn.execute(
+            """INSERT INTO invite_blasts (event_id, status, total, created_at, updated_at)
+               VALUES (?, 'running', ?, ?, ?)""",
+            (event_id, total, now, now),
+        )
+        blast_id = c.lastrowid
+    conn.commit()
+    _spawn_invite_blast(blast_id)
+    return blast_id
+
+
+def resume_invite_blasts(stale_after: float = INVITE_BLAST_STALE_SECONDS) -> None:
+    """Resume blasts that were interrupted by a restart.
+
+    Only blasts idle for ``stale_after`` seconds are resumed; pass 0 when
+    no other process can be working on them. Each blast is claimed by
+    bumping its updated_at, so only one of several workers resumes it.
+    """
+    conn = get_db()
+    now = time.time()
+    rows = conn.execute(
+        "SELECT id FROM invite_blasts WHERE status='running' AND updated_at <= ?",
+        (now - stale_after,),
+    ).fetchall()
+    for (blast_id,) in rows:
+        with conn:
+            claimed = conn.execute(
+                """UPDATE invite_blasts SET updated_at=?
+                   WHERE id=? AND status='running' AND updated_at <= ?""",
+                (now, blast_id, now - stale_after),
+            ).rowcount
+        if not claimed:
+            continue
+        print(f"[BLAST] Resuming blast {blast_id}")
+        _spawn_invite_blast(blast_id)
+
+
+def release_invite_blasts() -> None:
+    """Mark running blasts as abandoned so the next resume picks them up.
+
+    Only call this when no process can be working on them, e.g. from a
+    server's master process before it starts any workers.
+    """
+    conn = get_db()
+    with conn:
+        conn.execute("UPDATE invite_blasts SET updated_at=0 WHERE status='running'")
+
+
+def get_latest_invite_blast(conn: sqlite3.Connection, event_id: int) -> dict | None:
+    """Return the progress of the event's most recent blast, if any."""
+    row = conn.execute(
+        """SELECT id, status, total, sent, failed, last_error FROM invite_blasts
+           WHERE event_id=? ORDER BY id DESC LIMIT 1""",
+        (event_id,),
+    ).fetchone()
+    if not row:
+        return None
+    blast_id, status, total, sent, failed, last_error = row
+    return {
+        "id": blast_id,
+        "status": status,
+        "total": total,
+        "sent": sent,
+        "failed": failed,
+        "last_error": last_error,
+    }
 
-                # Check for anonymous RSVP success message
-                query_string = environ.get("QUERY_STRING", "")
-                rsvp_success = None
-                if "rsvp_success=" in query_string:
-                    try:
-                        rsvp_success = urllib.parse.parse_qs(query_string)[
-                            "rsvp_success"
-                        ][0]
-                    except:
-                        pass
-
-                # Handle logged-in users
-                if user_id:
-                    # Fetch user name and admin status
-                    c.execute("SELECT name, is_admin FROM users WHERE id=?", (user_id,))
-                    user_row = c.fetchone()
-                    user_name = user_row[0] if user_row else "Guest"
-                    is_admin = user_row[1] if user_row else False
-                    # Fetch RSVP status and quantities
-                    c.execute(
-                        "SELECT rsvp, adults_qty, kids_qty FROM invites WHERE event_id=? AND user_id=?",
-                        (event_id, user_id),
-                    )
-                    rsvp_row = c.fetchone()
-                    rsvp_status = rsvp_row[0] if rsvp_row else None
-                    adults_qty = rsvp_row[1] if rsvp_row else 1
-                    kids_qty = rsvp_row[2] if rsvp_row else 0
-                else:
-                    # Anonymous user viewing the event
-                    user_name = "Guest"
-                    is_admin = False
-                    rsvp_status = (
-                        rsvp_success  # Show success message if they just completed RSVP
-                    )
-                    adults_qty = 1
-                    kids_qty = 0
-                # Fetch comments
-                c.execute(
-                    """SELECT comments.comment, 
-                                    COALESCE(users.name, comments.comment_name) as display_name, 
-                                    comments.timestamp
-                             FROM comments LEFT JOIN users ON comments.user_id = users.id
-                             WHERE comments.event_id=? ORDER BY comments.timestamp ASC""",
-                    (event_id,),
-                )
-                raw_comments = c.fetchall()
-
-                # Format comments with readable timestamps
-                import datetime
-
-                comments = []
-                for comment_text, display_name, timestamp in raw_comments:
-                    if timestamp:
-                        try:
-                            # Convert timestamp to readable format
-                            dt = datetime.datetime.fromtimestamp(timestamp)
-                            now = datetime.datetime.now()
-                            diff = now - dt
-
-                            if diff.days > 0:
-                                if diff.days == 1:
-                                    time_ago = "1 day ago"
-                                else:
-                                    time_ago = f"{diff.days} days ago"
-                            elif diff.seconds > 3600:
-                                hours = diff.seconds // 3600
-                                if hours == 1:
-                                    time_ago = "1 hour ago"
-                                else:
-                                    time_ago = f"{hours} hours ago"
-                            elif diff.seconds > 60:
-                                minutes = diff.seconds // 60
-                                if minutes == 1:
-                                    time_ago = "1 minute ago"
-                                else:
-                                    time_ago = f"{minutes} minutes ago"
-                            else:
-                                time_ago = "just now"
-                        except Exception:
-                            time_ago = "recently"
-                    else:
-                        time_ago = "recently"
-
-                    comments.append((comment_text, display_name, time_ago))
-
-                conn.close()
-                # Format date/time for display (timezone naive)
-                import datetime
-
-                try:
-                    dt = datetime.datetime.fromisoformat(datetime_str)
-                    date_display = dt.strftime("%A, %B %-d, %Y")
-                    time_display = dt.strftime("%-I:%M %p")
-                except Exception:
-                    date_display = datetime_str
-                    time_display = ""
-                template = env.get_template("event.html")
-                body = template.render(
-                    title=title,
-                    description=description,
-                    host=host,
-                    date_display=date_display,
-                    time_display=time_display,
-                    location=location,
-                    registry1=reg1,
-                    registry2=reg2,
-                    header_image=header_image,
-                    user_name=user_name,
-                    rsvp_status=rsvp_status,
-                    comments=comments,
-                    event_id=event_id,
-                    is_admin=is_admin,
-                    adults_qty=adults_qty,
-                    kids_qty=kids_qty,
-                    calendar_links=calendar_links,
-                    base_url=BASE_URL,
-                )
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-            elif method == "POST":
-                # Handle RSVP or comment submission
-
-                params = parse_post(environ)
-                action = params.get("action", "")
-                conn = sqlite3.connect(DB_PATH)
-                c = conn.cursor()
-                if action == "rsvp":
-                    response = params.get("response", "")
-                    if response in ("yes", "no"):
-                        if response == "yes":
-                            # Get quantities for attending guests
-                            adults_qty = int(params.get("adults_qty", 1))
-                            kids_qty = int(params.get("kids_qty", 0))
-                            dietary_restrictions = params.get(
-                                "dietary_restrictions", ""
-                            ).strip()
-                        else:
-                            # For "no" response, clear quantities and dietary restrictions
-                            adults_qty = 1
-                            kids_qty = 0
-                            dietary_restrictions = ""
-
-                        # Use INSERT OR REPLACE to handle both new RSVPs and updates
-                        c.execute(
-                            """INSERT OR REPLACE INTO invites 
-                                     (event_id, user_id, rsvp, adults_qty, kids_qty, dietary_restrictions, is_anonymous)
-                                     VALUES (?, ?, ?, ?, ?, ?, 0)""",
-                            (
-                                event_id,
-                                user_id,
-                                response,
-                                adults_qty,
-                                kids_qty,
-                                dietary_restrictions,
-                            ),
-                        )
-                        conn.commit()
-
-                        # Get user details for email confirmation
-                        c.execute(
-                            "SELECT name, email FROM users WHERE id=?", (user_id,)
-                        )
-                        user_result = c.fetchone()
-                        if user_result:
-                            guest_name, guest_email = user_result
-                            # Send confirmation emails
-                            send_rsvp_confirmation_emails(
-                                event_id,
-                                guest_name,
-                                guest_email,
-                                response,
-                                adults_qty,
-                                kids_qty,
-                                dietary_restrictions,
-                                is_anonymous=False,
-                            )
-                elif action == "comment":
-                    # Get current user from session
-                    current_user_id = get_user_from_session(environ)
-
-                    comment_text = params.get("comment", "").strip()
-                    comment_name = params.get("comment_name", "").strip()
-                    print(
-                        f"Debug: comment_text='{comment_text}', comment_name='{comment_name}', user_id={current_user_id}"
-                    )
-                    if comment_text and comment_name:
-                        c.execute(
-                            "INSERT INTO comments (event_id, user_id, comment, comment_name, timestamp) VALUES (?,?,?,?,?)",
-                            (
-                                event_id,
-                                current_user_id,
-                                comment_text,
-                                comment_name,
-                                time.time(),
-                            ),
-                        )
-                        conn.commit()
-                        print(f"Debug: Comment inserted for event {event_id}")
-                    else:
-                        print("Debug: Comment not inserted - missing text or name")
-                conn.close()
-                start_response("302 Found", [("Location", f"/event/{event_id}")])
-                return [b""]
 
-        # If the path format does not match /event/<id>
-        start_response("404 Not Found", [("Content-Type", "text/plain")])
-        return [b"Event not found"]
+# -------------------------------------------------------------------
+# Click tracking
+
+# Invite link clicks are buffered in memory and written by a background
+# flusher, so rendering the RSVP page never waits for the SQLite write
+# lock. The flusher writes everything buffered in one transaction every
+# CLICK_FLUSH_INTERVAL_MS, or sooner once CLICK_FLUSH_MAX_EVENTS clicks
+# are waiting, adding one counter update per invite rather than one per
+# click. The buffer is flushed on shutdown; clicks beyond
+# CLICK_BUFFER_MAX_EVENTS (if the database is unavailable for a long
+# time) are dropped rather than letting memory grow.
+CLICK_FLUSH_INTERVAL_MS = int(os.environ.get("CLICK_FLUSH_INTERVAL_MS", "500"))
+CLICK_FLUSH_MAX_EVENTS = int(os.environ.get("CLICK_FLUSH_MAX_EVENTS", "200"))
+CLICK_BUFFER_MAX_EVENTS = int(os.environ.get("CLICK_BUFFER_MAX_EVENTS", "100000"))
+
+# (event_id, guest_phone, clicked_at, ip_address, user_agent)
+_click_buffer: list[tuple[int, str, float, str, str]] = []
+_click_buffer_lock = threading.Lock()
+_click_flusher: threading.Thread | None = None
+_click_flusher_pid: int | None = None
+_click_wakeup = threading.Event()
+_click_stop = threading.Event()
 
-    if path.startswith("/admin/event/"):
-        segments = path.strip("/").split("/")
-        if len(segments) == 3:
-            try:
-                event_id = int(segments[2])
-            except ValueError:
-                start_response("404 Not Found", [("Content-Type", "text/plain")])
-                return [b"Event not found"]
-
-            # Ensure user is logged in and is admin
-            user_id = get_user_from_session(environ)
-            if not user_id:
-                start_response("302 Found", [("Location", "/login")])
-                return [b""]
-
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute("SELECT is_admin FROM users WHERE id=?", (user_id,))
-            user_row = c.fetchone()
-            if not user_row or not user_row[0]:
-                conn.close()
-                start_response("403 Forbidden", [("Content-Type", "text/plain")])
-                return [b"Admin access required"]
-
-            if method == "GET":
-                # Fetch event details for editing
-                c.execute(
-                    """SELECT id, title, description, host, datetime, location,
-                             registry1, registry2, header_image, card_theme FROM events WHERE id=?""",
-                    (event_id,),
-                )
-                event_row = c.fetchone()
-                if not event_row:
-                    conn.close()
-                    start_response("404 Not Found", [("Content-Type", "text/plain")])
-                    return [b"Event not found"]
-
-                # Convert to dict for template
-                event = {
-                    "id": event_row[0],
-                    "title": event_row[1],
-                    "description": event_row[2] or "",
-                    "host": event_row[3] or "",
-                    "datetime": event_row[4] or "",
-                    "location": event_row[5] or "",
-                    "registry1": event_row[6] or "",
-                    "registry2": event_row[7] or "",
-                    "header_image": event_row[8] or "",
-                    "card_theme": event_row[9] or "ocean",
-                }
 
-                # Fetch RSVP statistics and guest list (both registered and anonymous)
-                c.execute(
-                    """SELECT 
-                             COALESCE(u.name, i.guest_name) as name,
-                             COALESCE(u.email, i.guest_email) as email,
-                             i.guest_phone,
-                             i.rsvp, i.adults_qty, i.kids_qty, i.is_anonymous, i.dietary_restrictions,
-                             COALESCE(i.click_count, 0) as click_count,
-                             i.first_clicked_at,
-                             i.last_clicked_at
-                             FROM invites i
-                             LEFT JOIN users u ON u.id = i.user_id 
-                             WHERE i.event_id = ? 
-                             ORDER BY name""",
-                    (event_id,),
-                )
-                guest_rows = c.fetchall()
-                conn.close()
-
-                guests = []
-                attending = 0
-                not_attending = 0
-                no_response = 0
-                total_adults = 0
-                total_kids = 0
-
-                for (
-                    name,
-                    email,
-                    phone,
-                    rsvp,
-                    adults_qty,
-                    kids_qty,
-                    is_anonymous,
-                    dietary_restrictions,
-                    click_count,
-                    first_clicked_at,
-                    last_clicked_at,
-                ) in guest_rows:
-                    guests.append(
-                        {
-                            "name": name or "Anonymous",
-                            "email": email or "",
-                            "phone": phone or "",
-                            "rsvp": rsvp,
-                            "adults_qty": adults_qty or 1,
-                            "kids_qty": kids_qty or 0,
-                            "is_anonymous": is_anonymous,
-                            "dietary_restrictions": dietary_restrictions or "",
-                            "click_count": click_count or 0,
-                            "first_clicked_at": first_clicked_at,
-                            "last_clicked_at": last_clicked_at,
-                        }
-                    )
+def track_invite_click(event_id: int, guest_phone: str, environ) -> None:
+    """Record a click on a guest's invite link, to be written shortly."""
+    click = (
+        event_id,
+        guest_phone,
+        time.time(),
+        environ.get("REMOTE_ADDR", "unknown"),
+        environ.get("HTTP_USER_AGENT", "unknown"),
+    )
+    with _click_buffer_lock:
+        if len(_click_buffer) >= CLICK_BUFFER_MAX_EVENTS:
+            return
+        _click_buffer.append(click)
+        pending = len(_click_buffer)
+    start_click_flusher()
+    if pending >= CLICK_FLUSH_MAX_EVENTS:
+        _click_wakeup.set()
+
+
+def flush_clicks() -> int:
+    """Write buffered clicks to the database and return how many."""
+    global _click_buffer
+    with _click_buffer_lock:
+        clicks, _click_buffer = _click_buffer, []
+    if not clicks:
+        return 0
+    # One counter update per invite, however many times it was clicked
+    counters: dict[tuple[int, str], list] = {}
+    for event_id, guest_phone, clicked_at, _, _ in clicks:
+        counter = counters.get((event_id, guest_phone))
+        if counter is None:
+            counters[(event_id, guest_phone)] = [1, clicked_at, clicked_at]
+        else:
+            counter[0] += 1
+            counter[1] = min(counter[1], clicked_at)
+            counter[2] = max(counter[2], clicked_at)
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        invite_ids = {}
+        for event_id, guest_phone in counters:
+            row = conn.execute(
+                """SELECT id FROM invites
+                   WHERE event_id = ? AND guest_phone = ? AND is_anonymous = 1""",
+                (event_id, guest_phone),
+            ).fetchone()
+            if row:
+                invite_ids[(event_id, guest_phone)] = row[0]
+        conn.executemany(
+            """UPDATE invites SET
+               click_count = click_count + ?,
+               first_clicked_at = COALESCE(first_clicked_at, ?),
+               last_clicked_at = MAX(COALESCE(last_clicked_at, 0), ?)
+               WHERE id = ?""",
+            [
+                (count, first, last, invite_ids[key])
+                for key, (count, first, last) in counters.items()
+                if key in invite_ids
+            ],
+        )
+        rows = [
+            (invite_ids[(event_id, guest_phone)], event_id, guest_phone, *details)
+            for event_id, guest_phone, *details in clicks
+            if (event_id, guest_phone) in invite_ids
+        ]
+        conn.executemany(
+            """INSERT INTO invite_clicks
+               (invite_id, event_id, guest_phone, clicked_at, ip_address, user_agent)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            rows,
+        )
+        record_click_rollups(conn, rows)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        # Put the clicks back to be retried with the next flush
+        with _click_buffer_lock:
+            room = CLICK_BUFFER_MAX_EVENTS - len(_click_buffer)
+            _click_buffer[:0] = clicks[:room]
+        raise
+    return len(clicks)
+
+
+def _click_flusher_loop() -> None:
+    """Flush buffered clicks until stop_click_flusher() is called."""
+    while not _click_stop.is_set():
+        _click_wakeup.wait(CLICK_FLUSH_INTERVAL_MS / 1000)
+        _click_wakeup.clear()
+        try:
+            flush_clicks()
+        except Exception as e:
+            print(f"[CLICKS] Flush failed, will retry: {e}")
+        finally:
+            release_db()
+
+
+def start_click_flusher() -> None:
+    """Start this process's click flusher thread if it is not running."""
+    global _click_flusher, _click_flusher_pid
+    pid = os.getpid()
+    if _click_flusher_pid == pid and _click_flusher is not None:
+        return
+    with _click_buffer_lock:
+        if _click_flusher_pid == pid and _click_flusher is not None:
+            return
+        _click_stop.clear()
+        _click_flusher = threading.Thread(
+            target=_click_flusher_loop, name="click-flusher", daemon=True
+        )
+        _click_flusher_pid = pid
+        _click_flusher.start()
+
+
+def stop_click_flusher(timeout: float = 10.0) -> None:
+    """Stop the click flusher and write whatever is still buffered."""
+    global _click_flusher
+    with _click_buffer_lock:
+        flusher = _click_flusher
+        _click_flusher = None
+    if flusher is not None and _click_flusher_pid == os.getpid():
+        _click_stop.set()
+        _click_wakeup.set()
+        flusher.join(timeout)
+    try:
+        flush_clicks()
+    except Exception as e:
+        print(f"[CLICKS] Could not save {len(_click_buffer)} clicks on shutdown: {e}")
+    finally:
+        release_db()
+
+
+# -------------------------------------------------------------------
+# Click analytics
+
+# Clicks are rolled up into hourly and daily buckets per invite, plus an
+# event-wide row stored under invite_id 0, as they are flushed, so
+# dashboards read a few hundred rollup rows however long the raw
+# invite_clicks log grows. A device is an IP address and user agent
+# pair; new_devices counts devices seen for the first time on a guest's
+# link, so summing it over all buckets gives unique devices per guest.
+# Buckets are aligned to UTC.
+CLICK_ROLLUP_BUCKETS = {"hour": 3600, "day": 86400}
+# How many buckets of each size the dashboard shows by default
+CLICK_ANALYTICS_SPANS = {"hour": 48, "day": 30}
+
+
+def record_click_rollups(conn: sqlite3.Connection, clicks: list[tuple]) -> None:
+    """Add clicks to the rollups, inside the caller's transaction.
+
+    Each click is (invite_id, event_id, guest_phone, clicked_at,
+    ip_address, user_agent), as inserted into invite_clicks.
+    """
+    totals: dict[tuple, list[int]] = {}
+    for invite_id, event_id, _, clicked_at, ip_address, user_agent in clicks:
+        new_device = conn.execute(
+            """INSERT OR IGNORE INTO invite_devices
+               (invite_id, ip_address, user_agent, first_seen_at) VALUES (?,?,?,?)""",
+            (invite_id, ip_address or "", user_agent or "", clicked_at),
+        ).rowcount
+        for bucket, seconds in CLICK_ROLLUP_BUCKETS.items():
+            start = int(clicked_at // seconds * seconds)
+            for key in (
+                (event_id, invite_id, bucket, start),
+                (event_id, 0, bucket, start),
+            ):
+                total = totals.setdefault(key, [0, 0])
+                total[0] += 1
+                total[1] += new_device
+    conn.executemany(
+        """INSERT INTO click_rollups
+           (event_id, invite_id, bucket, bucket_start, clicks, new_devices)
+           VALUES (?,?,?,?,?,?)
+           ON CONFLICT(event_id, invite_id, bucket, bucket_start) DO UPDATE SET
+           clicks = clicks + excluded.clicks,
+           new_devices = new_devices + excluded.new_devices""",
+        [(*key, clicks, new_devices) for key, (clicks, new_devices) in totals.items()],
+    )
+
+
+def get_click_series(
+    conn: sqlite3.Connection,
+    event_id: int,
+    bucket: str,
+    since: int,
+    until: int,
+    invite_id: int = 0,
+) -> list[dict]:
+    """Return click counts per bucket in [since, until), oldest first.
+
+    Buckets without clicks are omitted. ``invite_id`` 0 means the whole
+    event.
+    """
+    rows = conn.execute(
+        """SELECT bucket_start, clicks, new_devices FROM click_rollups
+           WHERE event_id=? AND invite_id=? AND bucket=?
+           AND bucket_start >= ? AND bucket_start < ?
+           ORDER BY bucket_start""",
+        (event_id, invite_id, bucket, since, until),
+    ).fetchall()
+    return [
+        {"start": start, "clicks": clicks, "new_devices": new_devices}
+        for start, clicks, new_devices in rows
+    ]
+
+
+def get_click_totals(conn: sqlite3.Connection, event_id: int) -> dict:
+    """Return an event's all-time clicks, unique devices and clicked guests."""
+    clicks, devices = conn.execute(
+        """SELECT COALESCE(SUM(clicks), 0), COALESCE(SUM(new_devices), 0)
+           FROM click_rollups WHERE event_id=? AND invite_id=0 AND bucket='day'""",
+        (event_id,),
+    ).fetchone()
+    (guests,) = conn.execute(
+        "SELECT COUNT(*) FROM invites WHERE event_id=? AND click_count > 0",
+        (event_id,),
+    ).fetchone()
+    return {"clicks": clicks, "unique_devices": devices, "guests_clicked": guests}
+
+
+def get_click_leaders(conn: sqlite3.Connection, event_id: int, limit: int = 20) -> list[dict]:
+    """Return the guests whose links were clicked most, with device counts."""
+    rows = conn.execute(
+        """SELECT r.invite_id, i.guest_name, i.guest_phone,
+                  SUM(r.clicks) AS clicks, SUM(r.new_devices)
+           FROM click_rollups r JOIN invites i ON i.id = r.invite_id
+           WHERE r.event_id=? AND r.invite_id != 0 AND r.bucket='day'
+           GROUP BY r.invite_id ORDER BY clicks DESC LIMIT ?""",
+        (event_id, limit),
+    ).fetchall()
+    return [
+        {
+            "invite_id": invite_id,
+            "name": name or "Anonymous",
+            "phone": phone or "",
+            "clicks": clicks,
+            "unique_devices": devices,
+        }
+        for invite_id, name, phone, clicks, devices in rows
+    ]
+
+
+# -------------------------------------------------------------------
+# Page cache
+
+# Rendered event pages are kept in memory so repeat visits skip Jinja
+# and most of SQLite. Entries are keyed by event, by the event's page
+# generation and by what distinguishes one viewer's copy from another's
+# (viewer class, name and RSVP state). Writes that change a page call
+# invalidate_event_pages(), which bumps events.page_generation in the
+# database, so every worker process stops serving the old entries on
+# its next request. Entries also expire after PAGE_CACHE_TTL_SECONDS,
+# which keeps the "5 minutes ago" comment times fresh. Set the TTL to 0
+# to disable the cache.
+PAGE_CACHE_TTL_SECONDS = float(os.environ.get("PAGE_CACHE_TTL_SECONDS", "30"))
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", "512"))
+
+_page_cache: OrderedDict[tuple, tuple[float, bytes]] = OrderedDict()
+_page_cache_lock = threading.Lock()
+
+
+def get_page_generation(conn: sqlite3.Connection, event_id: int) -> int:
+    """Return the event's current page generation (0 if it does not exist)."""
+    row = conn.execute(
+        "SELECT page_generation FROM events WHERE id=?", (event_id,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def get_cached_page(event_id: int, generation: int, viewer: tuple) -> bytes | None:
+    """Return a cached rendering of an event page, if still valid."""
+    if PAGE_CACHE_TTL_SECONDS <= 0:
+        return None
+    with _page_cache_lock:
+        key = (event_id, generation, viewer)
+        entry = _page_cache.get(key)
+        if entry is None:
+            return None
+        expires, body = entry
+        if expires < time.monotonic():
+            del _page_cache[key]
+            return None
+        _page_cache.move_to_end(key)
+        return body
+
+
+def cache_page(event_id: int, generation: int, viewer: tuple, body: bytes) -> None:
+    """Store a rendered event page, evicting the least recently used.
+
+    ``generation`` must be the one read before rendering, so a page
+    rendered while the event changed is never served as current.
+    """
+    if PAGE_CACHE_TTL_SECONDS <= 0:
+        return
+    with _page_cache_lock:
+        key = (event_id, generation, viewer)
+        _page_cache[key] = (time.monotonic() + PAGE_CACHE_TTL_SECONDS, body)
+        _page_cache.move_to_end(key)
+        while len(_page_cache) > PAGE_CACHE_MAX_ENTRIES:
+            _page_cache.popitem(last=False)
+
+
+def invalidate_event_pages(event_id: int) -> None:
+    """Discard every cached rendering of an event's page, in all processes."""
+    if PAGE_CACHE_TTL_SECONDS <= 0:
+        return
+    conn = get_db()
+    conn.execute(
+        "UPDATE events SET page_generation = page_generation + 1 WHERE id=?",
+        (event_id,),
+    )
+    conn.commit()
+
+
+# -------------------------------------------------------------------
+# Guest list import
+
+# Imported rows are validated in Python and staged in a temporary table
+# in batches of IMPORT_BATCH_SIZE, then merged into invites with a single
+# upsert rather than a SELECT plus an UPDATE or INSERT per row. Staging
+# only writes to the connection's temp database, so the main database is
+# locked just for the final merge.
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", "5000"))
+
+
+def import_guest_rows(
+    conn: sqlite3.Connection,
+    event_id: int,
+    rows: Iterable[dict],
+    progress: Callable[[int, list[str]], None] | None = None,
+) -> dict:
+    """Upsert CSV rows (Name, Phone, Email) as anonymous invites.
+
+    A guest is matched on phone number; when a phone appears more than
+    once, the last row wins and the earlier ones count as updates.
+    Returns the counts and per-row errors shown on the admin page. If
+    ``progress`` is given it is called after each batch with the number
+    of rows read so far and the errors found since the previous call,
+    and errors are passed to it instead of being kept in the results.
+    """
+    results = {
+        "success": True,
+        "imported_count": 0,
+        "new_count": 0,
+        "updated_count": 0,
+        "errors": [],
+    }
+    conn.execute(
+        """CREATE TEMP TABLE IF NOT EXISTS import_staging (
+            row_num INTEGER PRIMARY KEY,
+            guest_name TEXT NOT NULL,
+            guest_email TEXT,
+            guest_phone TEXT NOT NULL
+        )"""
+    )
+    try:
+        conn.execute("DELETE FROM import_staging")
+        batch = []
+        row_num = 0
+        for row_num, row in enumerate(rows, 1):
+            name = (row.get("Name") or "").strip()
+            phone = (row.get("Phone") or "").strip()
+            email = (row.get("Email") or "").strip()
+            if not name or not phone:
+                results["errors"].append(f"Row {row_num}: Missing required Name or Phone")
+            elif not (cleaned_phone := clean_phone_number(phone)):
+                results["errors"].append(f"Row {row_num}: Invalid phone number")
+            else:
+                batch.append((row_num, name, email or None, cleaned_phone))
+            if row_num % IMPORT_BATCH_SIZE == 0:
+                conn.executemany("INSERT INTO import_staging VALUES (?,?,?,?)", batch)
+                batch.clear()
+                if progress is not None:
+                    progress(row_num, results["errors"])
+                    results["errors"] = []
+        conn.executemany("INSERT INTO import_staging VALUES (?,?,?,?)", batch)
+        conn.commit()
+
+        # Take the write lock before reading, so no other write can land
+        # between counting the new guests and merging them
+        conn.execute("BEGIN IMMEDIATE")
+        (staged,) = conn.execute("SELECT COUNT(*) FROM import_staging").fetchone()
+        (new_count,) = conn.execute(
+            """SELECT COUNT(DISTINCT s.guest_phone) FROM import_staging s
+               WHERE NOT EXISTS (
+                   SELECT 1 FROM invites i
+                   WHERE i.event_id=? AND i.guest_phone=s.guest_phone
+                   AND i.is_anonymous=1
+               )""",
+            (event_id,),
+        ).fetchone()
+        # "WHERE true" keeps SQLite from reading ON CONFLICT as a join clause
+        conn.execute(
+            """INSERT INTO invites (event_id, guest_name, guest_email, guest_phone, is_anonymous)
+               SELECT ?, guest_name, guest_email, guest_phone, 1
+               FROM import_staging WHERE true ORDER BY row_num
+               ON CONFLICT(event_id, guest_phone) WHERE is_anonymous = 1
+               DO UPDATE SET guest_name=excluded.guest_name,
+                             guest_email=excluded.guest_email""",
+            (event_id,),
+        )
+        conn.execute("DELETE FROM import_staging")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    if progress is not None:
+        progress(row_num, results["errors"])
+        results["errors"] = []
+    results["imported_count"] = staged
+    results["new_count"] = new_count
+    results["updated_count"] = staged - new_count
+    if staged:
+        invalidate_event_pages(event_id)
+    return results
+
+
+# Imports run as background jobs. The upload is saved to a file under
+# IMPORT_UPLOAD_DIR and processed on a thread of the process that
+# received it, which records progress and per-row errors in import_jobs
+# and import_job_errors for the admin page to poll. A job whose progress
+# has not moved for IMPORT_JOB_STALE_SECONDS died with its process and
+# is reported as failed.
+IMPORT_UPLOAD_DIR = os.environ.get("IMPORT_UPLOAD_DIR", tempfile.gettempdir())
+IMPORT_JOB_STALE_SECONDS = float(os.environ.get("IMPORT_JOB_STALE_SECONDS", "300"))
+IMPORT_JOB_ERROR_LIMIT = int(os.environ.get("IMPORT_JOB_ERROR_LIMIT", "500"))
+
+
+def create_import_job(event_id: int, filename: str) -> int:
+    """Record a queued import job and return its ID."""
+    conn = get_db()
+    now = time.time()
+    with conn:
+        cursor = conn.execute(
+            """INSERT INTO import_jobs (event_id, filename, created_at, updated_at)
+               VALUES (?,?,?,?)""",
+            (event_id, filename, now, now),
+        )
+    return cursor.lastrowid
 
-                    if rsvp == "yes":
-                        attending += 1
-                        total_adults += adults_qty or 1
-                        total_kids += kids_qty or 0
-                    elif rsvp == "no":
-                        not_attending += 1
-                    else:
-                        no_response += 1
-
-                rsvp_stats = {
-                    "attending": attending,
-                    "not_attending": not_attending,
-                    "no_response": no_response,
-                    "total_adults": total_adults,
-                    "total_kids": total_kids,
-                }
 
-                # Parse import results from query string
-                query_string = environ.get("QUERY_STRING", "")
-                import_results = None
-                if query_string:
-                    url_params = urllib.parse.parse_qs(query_string)
-                    if "success" in url_params:
-                        success_msg = url_params["success"][0]
-                        if success_msg.startswith("imported_"):
-                            parts = success_msg.split("_")
-                            import_results = {
-                                "success": True,
-                                "imported_count": int(parts[1]),
-                                "new_count": int(parts[3]),
-                                "updated_count": int(parts[5]),
-                                "errors": [],
-                            }
-                    elif "error" in url_params:
-                        error_msg = url_params["error"][0]
-                        import_results = {
-                            "success": False,
-                            "imported_count": 0,
-                            "new_count": 0,
-                            "updated_count": 0,
-                            "errors": [f"Import failed: {error_msg}"],
-                        }
-
-                template = env.get_template("admin.html")
-                body = template.render(
-                    title="Admin - Edit Event",
-                    event=event,
-                    event_id=event_id,
-                    guests=guests,
-                    rsvp_stats=rsvp_stats,
-                    import_results=import_results,
+def run_import_job(job_id: int, upload_path: str) -> None:
+    """Import a saved CSV upload, recording progress as it goes."""
+    conn = get_db()
+    # Progress is written on a separate connection, since the import
+    # itself holds one transaction open until it commits
+    tracker = _open_connection(DB_PATH)
+    try:
+        (event_id,) = conn.execute(
+            "SELECT event_id FROM import_jobs WHERE id=?", (job_id,)
+        ).fetchone()
+
+        def progress(processed_rows: int, errors: list[str]) -> None:
+            with tracker:
+                tracker.execute(
+                    """UPDATE import_jobs SET status='running', processed_rows=?,
+                       error_count=error_count+?, updated_at=? WHERE id=?""",
+                    (processed_rows, len(errors), time.time(), job_id),
                 )
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-
-            elif method == "POST":
-                # Handle event update
-                params = parse_post(environ)
-                conn = sqlite3.connect(DB_PATH)
-                c = conn.cursor()
-                c.execute(
-                    """UPDATE events SET 
-                             title=?, description=?, host=?, datetime=?, location=?,
-                             registry1=?, registry2=?, card_theme=? WHERE id=?""",
-                    (
-                        params.get("title", ""),
-                        params.get("description", ""),
-                        params.get("host", ""),
-                        params.get("datetime", ""),
-                        params.get("location", ""),
-                        params.get("registry1", ""),
-                        params.get("registry2", ""),
-                        params.get("card_theme", "ocean"),
-                        event_id,
-                    ),
+                tracker.executemany(
+                    "INSERT INTO import_job_errors (job_id, message) VALUES (?,?)",
+                    [(job_id, message) for message in errors],
                 )
-                conn.commit()
-                conn.close()
-                start_response("302 Found", [("Location", f"/event/{event_id}")])
-                return [b""]
 
-        start_response("404 Not Found", [("Content-Type", "text/plain")])
-        return [b"Admin page not found"]
+        progress(0, [])
+        with open(upload_path, encoding="utf-8-sig", newline="") as upload:
+            reader = csv.DictReader(upload)
+            results = import_guest_rows(conn, event_id, reader, progress=progress)
+        if reader.line_num == 0:
+            raise ValueError("The uploaded file contained no CSV data")
+        with tracker:
+            tracker.execute(
+                """UPDATE import_jobs SET status='completed', imported_count=?,
+                   new_count=?, updated_count=?, updated_at=?, finished_at=?
+                   WHERE id=?""",
+                (
+                    results["imported_count"],
+                    results["new_count"],
+                    results["updated_count"],
+                    time.time(),
+                    time.time(),
+                    job_id,
+                ),
+            )
+        print(f"[IMPORT] Job {job_id} imported {results['imported_count']} guests")
+    except Exception as e:
+        print(f"[IMPORT] Job {job_id} failed: {e}")
+        with tracker:
+            tracker.execute(
+                """UPDATE import_jobs SET status='failed', last_error=?,
+                   updated_at=?, finished_at=? WHERE id=?""",
+                (str(e), time.time(), time.time(), job_id),
+            )
+    finally:
+        tracker.close()
+        release_db()
+        with contextlib.suppress(OSError):
+            os.remove(upload_path)
 
-    if path.startswith("/admin/import-csv/"):
-        segments = path.strip("/").split("/")
-        if len(segments) == 3:
+
+def start_import_job(event_id: int, upload, filename: str) -> int:
+    """Save an uploaded CSV stream and import it on a background thread."""
+    fd, upload_path = tempfile.mkstemp(
+        prefix="guest-import-", suffix=".csv", dir=IMPORT_UPLOAD_DIR
+    )
+    try:
+        with os.fdopen(fd, "wb") as saved:
+            shutil.copyfileobj(upload, saved, MULTIPART_CHUNK_SIZE)
+    except BaseException:
+        os.remove(upload_path)
+        raise
+    job_id = create_import_job(event_id, filename)
+    threading.Thread(
+        target=run_import_job,
+        args=(job_id, upload_path),
+        name=f"guest-import-{job_id}",
+        daemon=True,
+    ).start()
+    return job_id
+
+
+def get_import_job(
+    conn: sqlite3.Connection, job_id: int, error_limit: int = IMPORT_JOB_ERROR_LIMIT
+) -> dict | None:
+    """Return an import job's progress and up to ``error_limit`` errors."""
+    row = conn.execute(
+        """SELECT id, event_id, status, filename, processed_rows, imported_count,
+                  new_count, updated_count, error_count, last_error, updated_at
+           FROM import_jobs WHERE id=?""",
+        (job_id,),
+    ).fetchone()
+    if not row:
+        return None
+    (
+        job_id,
+        event_id,
+        status,
+        filename,
+        processed_rows,
+        imported_count,
+        new_count,
+        updated_count,
+        error_count,
+        last_error,
+        updated_at,
+    ) = row
+    if status in ("queued", "running") and time.time() - updated_at > IMPORT_JOB_STALE_SECONDS:
+        status = "failed"
+        last_error = "The import was interrupted. Please upload the file again."
+        with conn:
+            conn.execute(
+                """UPDATE import_jobs SET status=?, last_error=?, finished_at=?
+                   WHERE id=? AND status IN ('queued', 'running')""",
+                (status, last_error, time.time(), job_id),
+            )
+    errors = [
+        message
+        for (message,) in conn.execute(
+            "SELECT message FROM import_job_errors WHERE job_id=? ORDER BY id LIMIT ?",
+            (job_id, error_limit),
+        )
+    ]
+    return {
+        "id": job_id,
+        "event_id": event_id,
+        "status": status,
+        "filename": filename,
+        "processed_rows": processed_rows,
+        "imported_count": imported_count,
+        "new_count": new_count,
+        "updated_count": updated_count,
+        "error_count": error_count,
+        "errors": errors,
+        "last_error": last_error,
+    }
+
+
+def get_latest_import_job(conn: sqlite3.Connection, event_id: int) -> dict | None:
+    """Return the progress of the event's most recent import, if any."""
+    row = conn.execute(
+        "SELECT id FROM import_jobs WHERE event_id=? ORDER BY id DESC LIMIT 1",
+        (event_id,),
+    ).fetchone()
+    return get_import_job(conn, row[0]) if row else None
+
+
+# -------------------------------------------------------------------
+# Response compression
+
+# Text responses are gzip- or Brotli-compressed for clients that accept
+# it. Brotli is used only when the optional ``brotli`` package is
+# installed. Static assets are compressed once at maximum level and
+# cached; rendered pages are compressed per response at a faster level,
+# and only above COMPRESS_MIN_BYTES since tiny bodies do not benefit.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = frozenset(
+    {
+        "text/html",
+        "text/css",
+        "text/plain",
+        "text/calendar",
+        "application/javascript",
+        "application/json",
+        "image/svg+xml",
+    }
+)
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+
+
+def is_compressible(content_type: str) -> bool:
+    """Return True if responses of this Content-Type are worth compressing."""
+    return content_type.split(";", 1)[0].strip() in COMPRESSIBLE_TYPES
+
+
+def negotiate_encoding(environ) -> str | None:
+    """Pick "br" or "gzip" from the request's Accept-Encoding, if allowed."""
+    header = environ.get("HTTP_ACCEPT_ENCODING", "")
+    if not header:
+        return None
+    accepted = {}
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
             try:
-                event_id = int(segments[2])
+                quality = float(params[2:])
             except ValueError:
-                start_response("404 Not Found", [("Content-Type", "text/plain")])
-                return [b"Event not found"]
-
-            # Ensure user is logged in and is admin
-            user_id = get_user_from_session(environ)
-            if not user_id:
-                start_response("302 Found", [("Location", "/login")])
-                return [b""]
-
-            conn = sqlite3.connect(DB_PATH)
-            c = conn.cursor()
-            c.execute("SELECT is_admin FROM users WHERE id=?", (user_id,))
-            user_row = c.fetchone()
-            if not user_row or not user_row[0]:
-                conn.close()
-                start_response("403 Forbidden", [("Content-Type", "text/plain")])
-                return [b"Admin access required"]
-
-            if method == "POST":
-                # Handle CSV file upload
-                import csv
-                import io
-
-                try:
-                    # Parse multipart form data
-                    content_type = environ.get("CONTENT_TYPE", "")
-                    if not content_type.startswith("multipart/form-data"):
-                        start_response(
-                            "400 Bad Request", [("Content-Type", "text/plain")]
-                        )
-                        return [b"Invalid content type"]
-
-                    # Get the uploaded file data
-                    content_length = int(environ.get("CONTENT_LENGTH", 0))
-                    if content_length == 0:
-                        start_response(
-                            "400 Bad Request", [("Content-Type", "text/plain")]
-                        )
-                        return [b"No file uploaded"]
-
-                    post_data = environ["wsgi.input"].read(content_length)
-
-                    # Simple CSV parsing (basic multipart handling)
-                    # Find the CSV content between boundaries
-                    post_str = post_data.decode("utf-8", errors="ignore")
-
-                    # Look for CSV content (lines starting with data)
-                    lines = post_str.split("\n")
-                    csv_lines = []
-                    in_csv = False
-
-                    for line in lines:
-                        # Skip multipart headers and boundaries
-                        if (
-                            line.strip().startswith("--")
-                            or "Content-Disposition" in line
-                            or "Content-Type" in line
-                        ):
-                            continue
-                        if line.strip() == "":
-                            in_csv = True
-                            continue
-                        if in_csv and "," in line:
-                            csv_lines.append(line.strip())
-
-                    if not csv_lines:
-                        start_response(
-                            "302 Found",
-                            [
-                                (
-                                    "Location",
-                                    f"/admin/event/{event_id}?error=no_csv_data",
-                                )
-                            ],
-                        )
-                        return [b""]
-
-                    # Parse CSV data
-                    csv_content = "\n".join(csv_lines)
-                    csv_reader = csv.DictReader(io.StringIO(csv_content))
-
-                    import_results = {
-                        "success": True,
-                        "imported_count": 0,
-                        "new_count": 0,
-                        "updated_count": 0,
-                        "errors": [],
-                    }
-
-                    # Process each row
-                    for row_num, row in enumerate(csv_reader, 1):
-                        try:
-                            name = row.get("Name", "").strip()
-                            phone = row.get("Phone", "").strip()
-                            email = row.get("Email", "").strip()
-
-                            if not name or not phone:
-                                import_results["errors"].append(
-                                    f"Row {row_num}: Missing required Name or Phone"
-                                )
-                                continue
-
-                            # Clean phone number
-                            cleaned_phone = clean_phone_number(phone)
-
-                            # Check if invite already exists
-                            c.execute(
-                                "SELECT id FROM invites WHERE guest_phone=? AND event_id=? AND is_anonymous=1",
-                                (cleaned_phone, event_id),
-                            )
-                            existing = c.fetchone()
-
-                            if existing:
-                                # Update existing record
-                                c.execute(
-                                    """UPDATE invites SET guest_name=?, guest_email=? WHERE id=?""",
-                                    (name, email if email else None, existing[0]),
-                                )
-                                import_results["updated_count"] += 1
-                            else:
-                                # Create new invite record
-                                c.execute(
-                                    """INSERT INTO invites (event_id, guest_name, guest_email, guest_phone, is_anonymous)
-                                       VALUES (?, ?, ?, ?, 1)""",
-                                    (
-                                        event_id,
-                                        name,
-                                        email if email else None,
-                                        cleaned_phone,
-                                    ),
-                                )
-                                import_results["new_count"] += 1
-
-                            import_results["imported_count"] += 1
-
-                        except Exception as e:
-                            import_results["errors"].append(f"Row {row_num}: {str(e)}")
-                            continue
-
-                    conn.commit()
-                    conn.close()
-
-                    # Redirect back to admin page with results
-                    if import_results["imported_count"] > 0:
-                        message = f"success=imported_{import_results['imported_count']}_new_{import_results['new_count']}_updated_{import_results['updated_count']}"
-                    else:
-                        message = "error=no_valid_data"
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    for coding in ("br", "gzip"):
+        if coding == "br" and brotli is None:
+            continue
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
 
-                    start_response(
-                        "302 Found",
-                        [("Location", f"/admin/event/{event_id}?{message}")],
-                    )
-                    return [b""]
 
-                except Exception as e:
-                    conn.close()
-                    start_response(
-                        "302 Found",
-                        [("Location", f"/admin/event/{event_id}?error=upload_failed")],
-                    )
-                    return [b""]
+def compress(data: bytes, encoding: str, best: bool = False) -> bytes:
+    """Compress ``data`` with the given content coding."""
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if best else 5)
+    return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+
+
+def _variant_etag(etag: str, encoding: str) -> str:
+    """Return the ETag of the ``encoding``-compressed form of a response."""
+    return etag[:-1] + f'-{encoding}"' if etag.endswith('"') else etag
+
+
+def _compress_response(environ, start_response, app):
+    """Run ``app``, compressing its body if it is a large text response.
+
+    Only complete 200 responses are compressed: never HEAD requests or
+    ranged (Content-Range) bodies. A compressed body gets its own ETag
+    (see _variant_etag), and a client revalidating one has the plain tag
+    added to If-None-Match, so handlers only ever compare their own tags.
+    """
+    if environ.get("REQUEST_METHOD") == "HEAD":
+        return app(environ, start_response)
+    encoding = negotiate_encoding(environ)
+    variant_tags = set()
+    if encoding is not None and environ.get("HTTP_IF_NONE_MATCH"):
+        tags = [tag.strip() for tag in environ["HTTP_IF_NONE_MATCH"].split(",")]
+        suffix = f'-{encoding}"'
+        variant_tags = {tag for tag in tags if tag.endswith(suffix)}
+        if variant_tags:
+            plain = [tag[: -len(suffix)] + '"' for tag in variant_tags]
+            environ = dict(environ, HTTP_IF_NONE_MATCH=", ".join(tags + plain))
+
+    captured = []
+
+    def capture(status, headers, exc_info=None):
+        captured[:] = [status, headers, exc_info]
+        return lambda data: None
+
+    result = app(environ, capture)
+    status, headers, exc_info = captured
+    code = status.split(" ", 1)[0]
+    header_names = {name.lower(): value for name, value in headers}
+
+    if code == "304" and variant_tags and "etag" in header_names:
+        # Confirm the compressed copy the client asked about
+        etag = _variant_etag(header_names["etag"], encoding)
+        if etag in variant_tags:
+            headers = [(n, v) for n, v in headers if n.lower() != "etag"]
+            headers.append(("ETag", etag))
+    elif (
+        code == "200"
+        and isinstance(result, list)
+        and "content-encoding" not in header_names
+        and "content-range" not in header_names
+        and is_compressible(header_names.get("content-type", ""))
+    ):
+        vary = [
+            value.strip()
+            for name, values in headers
+            if name.lower() == "vary"
+            for value in values.split(",")
+            if value.strip()
+        ]
+        if "accept-encoding" not in (value.lower() for value in vary):
+            vary.append("Accept-Encoding")
+        headers = [(n, v) for n, v in headers if n.lower() != "vary"]
+        headers.append(("Vary", ", ".join(vary)))
+        body = b"".join(result)
+        if encoding is not None and len(body) >= COMPRESS_MIN_BYTES:
+            body = compress(body, encoding)
+            headers = [
+                (name, value)
+                for name, value in headers
+                if name.lower() not in ("content-length", "etag")
+            ]
+            headers += [
+                ("Content-Encoding", encoding),
+                ("Content-Length", str(len(body))),
+            ]
+            if "etag" in header_names:
+                headers.append(("ETag", _variant_etag(header_names["etag"], encoding)))
+        result = [body]
+    start_response(status, headers, exc_info)
+    return result
 
-        start_response("404 Not Found", [("Content-Type", "text/plain")])
-        return [b"CSV import not found"]
 
-    if path.startswith("/anonymous-rsvp/"):
-        segments = path.strip("/").split("/")
-        if len(segments) == 2:
+# -------------------------------------------------------------------
+# Static files
+
+STATIC_MIME_TYPES = {
+    ".css": "text/css",
+    ".js": "application/javascript",
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".svg": "image/svg+xml",
+}
+# Files up to this size are kept in memory after the first request;
+# larger ones are read from disk each time.
+STATIC_CACHE_MAX_FILE_BYTES = int(
+    os.environ.get("STATIC_CACHE_MAX_FILE_BYTES", str(512 * 1024))
+)
+# Block size used when streaming files that are not held in memory.
+STATIC_CHUNK_SIZE = 64 * 1024
+STATIC_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+STATIC_DEFAULT_CACHE_CONTROL = "public, no-cache"
+
+
+class StaticAsset:
+    """A static file's headers, validators and (if small) its contents."""
+
+    __slots__ = (
+        "path",
+        "size",
+        "mtime_ns",
+        "content_type",
+        "etag",
+        "fingerprint",
+        "last_modified",
+        "data",
+        "compressible",
+        "_encoded",
+    )
+
+    def __init__(self, path: str, st: os.stat_result) -> None:
+        self.path = path
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        ext = os.path.splitext(path)[1].lower()
+        self.content_type = STATIC_MIME_TYPES.get(ext, "application/octet-stream")
+        self.last_modified = formatdate(
+            st.st_mtime_ns // 1_000_000_000, usegmt=True
+        )
+
+        # Hash the contents once so the ETag and the fingerprint used in
+        # static URLs change exactly when the file does.
+        digest = hashlib.md5()
+        data = bytearray() if self.size <= STATIC_CACHE_MAX_FILE_BYTES else None
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                digest.update(chunk)
+                if data is not None:
+                    data += chunk
+        self.data = bytes(data) if data is not None else None
+        self.fingerprint = digest.hexdigest()[:12]
+        self.etag = f'"{self.fingerprint}"'
+        self.compressible = self.data is not None and is_compressible(
+            self.content_type
+        )
+        self._encoded: dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        """Return the contents compressed with ``encoding``, building it once."""
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = compress(self.data, encoding, best=True)
+            self._encoded[encoding] = body
+        return body
+
+    def read(self) -> bytes:
+        """Return the file's contents."""
+        if self.data is not None:
+            return self.data
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def not_modified(self, environ, etag: str | None = None) -> bool:
+        """Return True if the client's cached copy is still current.
+
+        ``etag`` is the validator of the representation being served,
+        which differs from ``self.etag`` for compressed variants.
+        """
+        if "HTTP_IF_NONE_MATCH" in environ:
+            return etag_matches(environ, etag or self.etag)
+        if_modified_since = environ.get("HTTP_IF_MODIFIED_SINCE")
+        if if_modified_since:
             try:
-                event_id = int(segments[1])
-            except ValueError:
-                start_response("404 Not Found", [("Content-Type", "text/plain")])
-                return [b"Event not found"]
-
-            if method == "GET":
-                # Show anonymous RSVP form
-                conn = sqlite3.connect(DB_PATH)
-                c = conn.cursor()
-                c.execute(
-                    """SELECT title, description, host, datetime, location,
-                             registry1, registry2, header_image FROM events WHERE id=?""",
-                    (event_id,),
-                )
-                event = c.fetchone()
-                conn.close()
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return self.mtime_ns // 1_000_000_000 <= int(since.timestamp())
+        return False
 
-                if not event:
-                    start_response("404 Not Found", [("Content-Type", "text/plain")])
-                    return [b"Event not found"]
+    def requested_range(self, environ) -> tuple[int, int] | tuple | None:
+        """Parse a single-range ``Range: bytes=...`` header.
 
-                (
-                    title,
-                    description,
-                    host,
-                    datetime_str,
-                    location,
-                    reg1,
-                    reg2,
-                    header_image,
-                ) = event
-
-                # Generate calendar links
-                calendar_links = generate_calendar_links(
-                    title, description, datetime_str, location
-                )
+        Returns ``(start, end)`` with an inclusive end, ``None`` when the
+        whole file should be sent, or ``()`` when the range cannot be
+        satisfied. Multi-range requests are answered with the whole file,
+        which HTTP allows.
+        """
+        header = environ.get("HTTP_RANGE", "")
+        if not header.startswith("bytes=") or "," in header:
+            return None
+        if_range = environ.get("HTTP_IF_RANGE")
+        if if_range and if_range not in (self.etag, self.last_modified):
+            return None
+        first, _, last = header[len("bytes=") :].strip().partition("-")
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else self.size - 1
+                # A last byte before the first is invalid, not
+                # unsatisfiable, so the header is ignored
+                if last and start > end:
+                    return None
+            else:
+                # Suffix range: the final N bytes
+                suffix = int(last)
+                if suffix == 0:
+                    return ()
+                start = max(0, self.size - suffix)
+                end = self.size - 1
+        except ValueError:
+            return None
+        if start >= self.size:
+            return ()
+        return start, min(end, self.size - 1)
+
+
+def _iter_file_range(f, length: int):
+    """Yield ``length`` bytes from ``f`` in chunks, then close it."""
+    try:
+        while length > 0:
+            chunk = f.read(min(STATIC_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
 
-                # Format date/time for display
-                import datetime
-
-                try:
-                    dt = datetime.datetime.fromisoformat(datetime_str)
-                    date_display = dt.strftime("%A, %B %-d, %Y")
-                    time_display = dt.strftime("%-I:%M %p")
-                except Exception:
-                    date_display = datetime_str
-                    time_display = ""
-
-                # Parse URL parameters for pre-filling
-                query_string = environ.get("QUERY_STRING", "")
-                url_params = urllib.parse.parse_qs(query_string)
-                prefill_name = (
-                    url_params.get("name", [""])[0] if "name" in url_params else ""
-                )
-                prefill_phone = (
-                    url_params.get("phone", [""])[0] if "phone" in url_params else ""
-                )
-                prefill_email = (
-                    url_params.get("email", [""])[0] if "email" in url_params else ""
-                )
 
-                # Track invite click if phone number is provided
-                if prefill_phone:
-                    track_invite_click(event_id, prefill_phone, environ)
-
-                template = env.get_template("anonymous_rsvp.html")
-                body = template.render(
-                    title=title,
-                    description=description,
-                    host=host,
-                    date_display=date_display,
-                    time_display=time_display,
-                    location=location,
-                    registry1=reg1,
-                    registry2=reg2,
-                    header_image=header_image,
-                    event_id=event_id,
-                    guest_name=prefill_name,
-                    guest_phone=prefill_phone,
-                    guest_email=prefill_email,
-                    error=None,
-                    calendar_links=calendar_links,
-                    base_url=BASE_URL,
-                    is_anonymous_link=True,
-                    current_url=f"{BASE_URL}/anonymous-rsvp/{event_id}",
-                )
-                start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-                return [body.encode("utf-8")]
-
-            elif method == "POST":
-                # Handle anonymous RSVP submission
-                params = parse_post(environ)
-                guest_name = params.get("guest_name", "").strip()
-                guest_email = params.get("guest_email", "").strip()
-                guest_phone = params.get("guest_phone", "").strip()
-                rsvp = params.get("rsvp", "")
-                dietary_restrictions = params.get("dietary_restrictions", "").strip()
-                adults_qty = (
-                    int(params.get("adults_qty", 1)) if params.get("adults_qty") else 1
-                )
-                kids_qty = (
-                    int(params.get("kids_qty", 0)) if params.get("kids_qty") else 0
-                )
+_static_cache: dict[str, StaticAsset] = {}
+_static_cache_lock = threading.Lock()
 
-                # Check for duplicates by phone number
-                conn = sqlite3.connect(DB_PATH)
-                c = conn.cursor()
-                c.execute(
-                    "SELECT id, guest_name FROM invites WHERE event_id=? AND guest_phone=? AND is_anonymous=1",
-                    (event_id, guest_phone),
-                )
-                existing_rsvp = c.fetchone()
-                conn.close()
-
-                if existing_rsvp:
-                    # Phone number already used - update existing RSVP
-                    conn = sqlite3.connect(DB_PATH)
-                    c = conn.cursor()
-                    c.execute(
-                        """UPDATE invites SET guest_name=?, guest_email=?, rsvp=?, adults_qty=?, kids_qty=?, dietary_restrictions=?
-                                 WHERE event_id=? AND guest_phone=? AND is_anonymous=1""",
-                        (
-                            guest_name,
-                            guest_email,
-                            rsvp,
-                            adults_qty,
-                            kids_qty,
-                            dietary_restrictions,
-                            event_id,
-                            guest_phone,
-                        ),
-                    )
-                    conn.commit()
-                    conn.close()
-
-                    # Send confirmation emails for the update
-                    send_rsvp_confirmation_emails(
-                        event_id,
-                        guest_name,
-                        guest_email,
-                        rsvp,
-                        adults_qty,
-                        kids_qty,
-                        dietary_restrictions,
-                        is_anonymous=True,
-                    )
 
-                    # Redirect back to event page with success message
-                    start_response(
-                        "302 Found",
-                        [("Location", f"/event/{event_id}?rsvp_success={rsvp}")],
-                    )
-                    return [b""]
-
-                if not guest_name or not guest_phone or rsvp not in ("yes", "no"):
-                    # Show form with error
-                    conn = sqlite3.connect(DB_PATH)
-                    c = conn.cursor()
-                    c.execute(
-                        """SELECT title, description, host, datetime, location,
-                                 registry1, registry2, header_image FROM events WHERE id=?""",
-                        (event_id,),
-                    )
-                    event = c.fetchone()
-                    conn.close()
-
-                    if event:
-                        (
-                            title,
-                            description,
-                            host,
-                            datetime_str,
-                            location,
-                            reg1,
-                            reg2,
-                            header_image,
-                        ) = event
-
-                        # Format date/time
-                        import datetime
-
-                        try:
-                            dt = datetime.datetime.fromisoformat(datetime_str)
-                            date_display = dt.strftime("%A, %B %-d, %Y")
-                            time_display = dt.strftime("%-I:%M %p")
-                        except Exception:
-                            date_display = datetime_str
-                            time_display = ""
-
-                        template = env.get_template("anonymous_rsvp.html")
-                        body = template.render(
-                            title=title,
-                            description=description,
-                            host=host,
-                            date_display=date_display,
-                            time_display=time_display,
-                            location=location,
-                            registry1=reg1,
-                            registry2=reg2,
-                            header_image=header_image,
-                            event_id=event_id,
-                            error="Please fill in your name, phone number, and select an RSVP option.",
-                            calendar_links=calendar_links,
-                            base_url=BASE_URL,
-                            is_anonymous_link=True,
-                        )
-                        start_response(
-                            "200 OK", [("Content-Type", "text/html; charset=utf-8")]
-                        )
-                        return [body.encode("utf-8")]
-
-                # Save anonymous RSVP
-                conn = sqlite3.connect(DB_PATH)
-                c = conn.cursor()
-                c.execute(
-                    """INSERT INTO invites (event_id, guest_name, guest_email, guest_phone, rsvp, adults_qty, kids_qty, dietary_restrictions, is_anonymous)
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)""",
-                    (
-                        event_id,
-                        guest_name,
-                        guest_email,
-                        guest_phone,
-                        rsvp,
-                        adults_qty,
-                        kids_qty,
-                        dietary_restrictions,
-                    ),
-                )
-                conn.commit()
-                conn.close()
+def get_static_asset(rel_path: str) -> StaticAsset | None:
+    """Return the cached asset for a path under STATIC_DIR, if it exists.
+
+    The file is stat'ed on every call so edits are picked up, but it is
+    only re-read and re-hashed when its size or mtime changes.
+    """
+    file_path = os.path.normpath(os.path.join(STATIC_DIR, rel_path))
+    if not file_path.startswith(STATIC_DIR + os.sep):
+        return None
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+
+    asset = _static_cache.get(file_path)
+    if asset is None or (asset.mtime_ns, asset.size) != (st.st_mtime_ns, st.st_size):
+        asset = StaticAsset(file_path, st)
+        with _static_cache_lock:
+            _static_cache[file_path] = asset
+    return asset
+
+
+def preload_static_assets() -> None:
+    """Load, fingerprint and compress static files ahead of the first request."""
+    for dirpath, dirnames, filenames in os.walk(STATIC_DIR):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            if not filename.startswith("."):
+                rel_path = os.path.relpath(os.path.join(dirpath, filename), STATIC_DIR)
+                asset = get_static_asset(rel_path)
+                if asset is not None and asset.compressible:
+                    asset.encoded("gzip")
+                    if brotli is not None:
+                        asset.encoded("br")
+
+
+def static_url(rel_path: str) -> str:
+    """Return the URL for a static file, fingerprinted when it exists.
+
+    Templates should link assets through this so browsers can cache
+    them for a year and still fetch the new version after a change.
+    """
+    url = "/static/" + rel_path
+    asset = get_static_asset(rel_path)
+    if asset is None:
+        return url
+    return f"{url}?v={asset.fingerprint}"
+
+
+env.globals["static_url"] = static_url
+
+
+def precompile_templates() -> None:
+    """Compile every page and email template ahead of the first request."""
+    for name in env.list_templates(extensions=("html", "txt")):
+        env.get_template(name)
+
+
+# -------------------------------------------------------------------
+# Routing
+
+
+class Router:
+    """Map URL patterns to handler functions.
+
+    Patterns are paths whose segments are either literal text, ``<int>``
+    (a decimal ID passed to the handler as an int) or a trailing
+    ``<path>`` (the rest of the path, passed as a string). Fixed paths
+    are looked up in a dict; patterns with placeholders are compiled
+    into a segment trie, so matching costs one step per path segment
+    regardless of how many routes are registered.
+    """
+
+    INT = "<int>"
+    PATH = "<path>"
+
+    def __init__(self) -> None:
+        self._exact: dict[str, dict[str, Callable]] = {}
+        self._tree: dict = {}
+
+    def add(self, pattern: str, handler: Callable, methods=("GET",)) -> None:
+        """Register ``handler`` for ``pattern`` and the given HTTP methods."""
+        segments = pattern.strip("/").split("/")
+        if self.INT not in segments and self.PATH not in segments:
+            handlers = self._exact.setdefault(pattern, {})
+        else:
+            node = self._tree
+            for segment in segments:
+                node = node.setdefault(segment, {})
+            handlers = node.setdefault(None, {})
+        for method in methods:
+            handlers[method] = handler
+
+    def route(self, pattern: str, methods=("GET",)):
+        """Decorator form of add()."""
+
+        def decorator(handler: Callable) -> Callable:
+            self.add(pattern, handler, methods)
+            return handler
+
+        return decorator
+
+    def match(self, path: str) -> tuple[dict[str, Callable], list] | None:
+        """Return ``(handlers by method, captured args)`` for ``path``."""
+        handlers = self._exact.get(path)
+        if handlers is not None:
+            return handlers, []
+        node = self._tree
+        args = []
+        segments = path.strip("/").split("/")
+        for i, segment in enumerate(segments):
+            child = node.get(segment)
+            if child is not None and segment not in (self.INT, self.PATH):
+                node = child
+            elif self.INT in node and segment.isdigit():
+                node = node[self.INT]
+                args.append(int(segment))
+            elif self.PATH in node and segment:
+                node = node[self.PATH]
+                args.append("/".join(segments[i:]))
+                break
+            else:
+                return None
+        handlers = node.get(None)
+        if handlers is None:
+            return None
+        return handlers, args
+
+
+router = Router()
+
+
+# -------------------------------------------------------------------
+# Request handlers
+
+
+def require_admin(environ, start_response) -> list[bytes] | None:
+    """Return an error response unless the request comes from an admin."""
+    user_id = get_user_from_session(environ)
+    if not user_id:
+        start_response("302 Found", [("Location", "/login")])
+        return [b""]
+
+    c = get_db().cursor()
+    c.execute("SELECT is_admin FROM users WHERE id=?", (user_id,))
+    user_row = c.fetchone()
+    if not user_row or not user_row[0]:
+        start_response("403 Forbidden", [("Content-Type", "text/plain")])
+        return [b"Admin access required"]
+    return None
+
+
+@router.route("/static/<path>", methods=("GET", "HEAD"))
+def static_file(environ, start_response, rel_path):
+    """Serve a file from the static directory."""
+    asset = get_static_asset(rel_path)
+    if asset is None:
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Not Found"]
+
+    # Fingerprinted URLs (see static_url) never change content, so they
+    # may be cached indefinitely; anything else must be revalidated.
+    query = urllib.parse.parse_qs(environ.get("QUERY_STRING", ""))
+    if query.get("v", [""])[0] == asset.fingerprint:
+        cache_control = STATIC_IMMUTABLE_CACHE_CONTROL
+    else:
+        cache_control = STATIC_DEFAULT_CACHE_CONTROL
+    # Compressed variants are only offered for whole-file responses.
+    encoding = None
+    if asset.compressible and "HTTP_RANGE" not in environ:
+        encoding = negotiate_encoding(environ)
+    etag = asset.etag if encoding is None else f'"{asset.fingerprint}-{encoding}"'
+    headers = [
+        ("ETag", etag),
+        ("Last-Modified", asset.last_modified),
+        ("Cache-Control", cache_control),
+    ]
+    if asset.compressible:
+        headers.append(("Vary", "Accept-Encoding"))
+
+    if asset.not_modified(environ, etag):
+        start_response("304 Not Modified", headers)
+        return [b""]
+
+    if encoding is not None:
+        body = asset.encoded(encoding)
+        headers += [
+            ("Content-Type", asset.content_type),
+            ("Content-Encoding", encoding),
+            ("Content-Length", str(len(body))),
+        ]
+        start_response("200 OK", headers)
+        if environ.get("REQUEST_METHOD", "GET").upper() == "HEAD":
+            return [b""]
+        return [body]
+
+    headers += [
+        ("Content-Type", asset.content_type),
+        ("Accept-Ranges", "bytes"),
+    ]
+    byte_range = asset.requested_range(environ)
+    if byte_range == ():
+        start_response(
+            "416 Range Not Satisfiable",
+            [("Content-Range", f"bytes */{asset.size}"), ("Content-Type", "text/plain")],
+        )
+        return [b""]
+    if byte_range is None:
+        status = "200 OK"
+        start, length = 0, asset.size
+    else:
+        status = "206 Partial Content"
+        start, end = byte_range
+        length = end - start + 1
+        headers.append(("Content-Range", f"bytes {start}-{end}/{asset.size}"))
+    headers.append(("Content-Length", str(length)))
+    start_response(status, headers)
+
+    if environ.get("REQUEST_METHOD", "GET").upper() == "HEAD":
+        return [b""]
+    if asset.data is not None:
+        return [asset.data[start : start + length]]
+
+    # Large files are streamed rather than read into memory. When the
+    # response runs to the end of the file the server's file_wrapper
+    # can hand it to sendfile(); a range that stops short is sent in
+    # bounded chunks so no server writes past Content-Length.
+    f = open(asset.path, "rb")
+    f.seek(start)
+    if start + length == asset.size:
+        file_wrapper = environ.get("wsgi.file_wrapper", FileWrapper)
+        return file_wrapper(f, STATIC_CHUNK_SIZE)
+    return _iter_file_range(f, length)
+
+
+@router.route("/", methods=("GET", "POST"))
+def index(environ, start_response):
+    """Redirect directly to the main event page."""
+    start_response("302 Found", [("Location", "/event/1")])
+    return [b""]
+
+
+@router.route("/register")
+def register_page(environ, start_response):
+    """Show the registration form."""
+    template = env.get_template("register.html")
+    body = template.render(title="Register", error=None)
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body.encode("utf-8")]
+
+
+@router.route("/register", methods=("POST",))
+def register_submit(environ, start_response):
+    """Create an account and log the new user in."""
+    params = parse_post(environ)
+    name = params.get("name", "").strip()
+    email = params.get("email", "").strip()
+    password = params.get("password", "")
+    if not (name and email and password):
+        template = env.get_template("register.html")
+        body = template.render(
+            title="Register", error="Please fill all fields."
+        )
+        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+        return [body.encode("utf-8")]
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        # Check if this is the first user (make them admin)
+        c.execute("SELECT COUNT(*) FROM users")
+        user_count = c.fetchone()[0]
+        is_first_user = user_count == 0
 
+        c.execute(
+            "INSERT INTO users (name, email, password_hash, is_admin) VALUES (?,?,?,?)",
+            (name, email, hash_password(password), is_first_user),
+        )
+        user_id = c.lastrowid
+        # For demonstration, automatically invite the new user to the default event (ID=1)
+        c.execute(
+            "INSERT INTO invites (event_id, user_id, rsvp) VALUES (?,?,?)",
+            (1, user_id, None),
+        )
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        template = env.get_template("register.html")
+        body = template.render(
+            title="Register", error="Email already registered."
+        )
+        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+        return [body.encode("utf-8")]
+    # Auto‑login after successful registration
+    headers = Headers(
+        [("Location", "/"), ("Set-Cookie", session_cookie(create_session(user_id)))]
+    )
+    start_response("302 Found", headers.items())
+    return [b""]
+
+
+@router.route("/login")
+def login_page(environ, start_response):
+    """Show the login form."""
+    template = env.get_template("login.html")
+    body = template.render(title="Login", error=None)
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body.encode("utf-8")]
+
+
+@router.route("/login", methods=("POST",))
+def login_submit(environ, start_response):
+    """Check credentials and start a session."""
+    params = parse_post(environ)
+    email = params.get("email", "").strip()
+    password = params.get("password", "")
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("SELECT id, password_hash FROM users WHERE email=?", (email,))
+    row = c.fetchone()
+    if row and hash_password(password) == row[1]:
+        user_id = row[0]
+        headers = Headers(
+            [("Location", "/"), ("Set-Cookie", session_cookie(create_session(user_id)))]
+        )
+        start_response("302 Found", headers.items())
+        return [b""]
+    else:
+        template = env.get_template("login.html")
+        body = template.render(
+            title="Login", error="Invalid email or password."
+        )
+        start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+        return [body.encode("utf-8")]
+
+
+@router.route("/logout", methods=("GET", "POST"))
+def logout(environ, start_response):
+    """End the current session and return to the event page."""
+    # Invalidate the session cookie
+    cookies = http.cookies.SimpleCookie(environ.get("HTTP_COOKIE", ""))
+    current = cookies.get("session_id")
+    headers = Headers([("Location", "/event/1")])
+    if current:
+        delete_session(current.value)
+        expired_cookie = http.cookies.SimpleCookie()
+        expired_cookie["session_id"] = ""
+        expired_cookie["session_id"]["path"] = "/"
+        expired_cookie["session_id"]["expires"] = "Thu, 01 Jan 1970 00:00:00 GMT"
+        headers.add_header("Set-Cookie", expired_cookie.output(header=""))
+    start_response("302 Found", headers.items())
+    return [b""]
+
+
+@router.route("/calendar/<int>")
+def calendar_download(environ, start_response, event_id):
+    """Download an event as an ICS file."""
+    # Fetch event details
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(
+        """SELECT title, description, host, datetime, location, version,
+                 updated_at FROM events WHERE id=?""",
+        (event_id,),
+    )
+    event = c.fetchone()
+
+    if not event:
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Event not found"]
+
+    title, description, host, datetime_str, location, version, updated_at = event
+    calendar_links = get_calendar_links(
+        event_id, version, updated_at, title, description, datetime_str, location
+    )
+
+    # Return ICS file content
+    headers = [
+        ("Content-Type", "text/calendar; charset=utf-8"),
+        ("Content-Disposition", f'attachment; filename="event_{event_id}.ics"'),
+        ("ETag", calendar_links["etag"]),
+        ("Cache-Control", "no-cache"),
+    ]
+    if etag_matches(environ, calendar_links["etag"]):
+        start_response("304 Not Modified", headers)
+        return [b""]
+    start_response("200 OK", headers)
+    return [calendar_links["ics_content"].encode("utf-8")]
+
+
+def serve_calendar_feed(environ, start_response, name, where, params):
+    """Send a calendar feed, or a 304 if the client's copy is current."""
+    etag, body = get_calendar_feed(get_db(), name, where, params)
+    headers = [
+        ("Content-Type", "text/calendar; charset=utf-8"),
+        ("ETag", etag),
+        ("Cache-Control", "no-cache"),
+    ]
+    if etag_matches(environ, etag):
+        start_response("304 Not Modified", headers)
+        return [b""]
+    data = body()
+    headers.append(("Content-Length", str(len(data))))
+    start_response("200 OK", headers)
+    if environ.get("REQUEST_METHOD", "GET").upper() == "HEAD":
+        return [b""]
+    return [data]
+
+
+@router.route("/calendar/host/<path>", methods=("GET", "HEAD"))
+def host_calendar_feed(environ, start_response, host):
+    """Serve a subscribable feed of every event a host is hosting."""
+    if not get_db().execute("SELECT 1 FROM events WHERE host=?", (host,)).fetchone():
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"No events for this host"]
+    return serve_calendar_feed(
+        environ, start_response, f"{host}'s events", "WHERE e.host = ?", (host,)
+    )
+
+
+@router.route("/calendar/feed/<path>", methods=("GET", "HEAD"))
+def user_calendar_feed(environ, start_response, token):
+    """Serve a private feed of the events a user is invited to.
+
+    Calendar apps cannot log in, so the feed is found by the user's
+    calendar token rather than by their session.
+    """
+    row = get_db().execute(
+        "SELECT id, name FROM users WHERE calendar_token=?", (token,)
+    ).fetchone()
+    if row is None:
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Calendar not found"]
+    user_id, user_name = row
+    # Events the guest has declined are left out
+    return serve_calendar_feed(
+        environ,
+        start_response,
+        f"{user_name}'s invitations",
+        """JOIN invites i ON i.event_id = e.id
+           WHERE i.user_id = ? AND i.rsvp IS NOT 'no'""",
+        (user_id,),
+    )
+
+
+@router.route("/calendar/subscribe")
+def calendar_subscribe(environ, start_response):
+    """Send a logged-in user to the webcal:// URL of their private feed."""
+    user_id = get_user_from_session(environ)
+    if not user_id:
+        start_response("302 Found", [("Location", "/login")])
+        return [b""]
+    token = get_calendar_feed_token(get_db(), user_id)
+    start_response(
+        "302 Found", [("Location", webcal_url(f"/calendar/feed/{token}"))]
+    )
+    return [b""]
+
+
+@router.route("/event/<int>")
+def event_page(environ, start_response, event_id):
+    """Render the event invitation page."""
+    # Check if user is logged in (but don't require it)
+    user_id = get_user_from_session(environ)
+    conn = get_db()
+    c = conn.cursor()
+
+    # Check for anonymous RSVP success message
+    query_string = environ.get("QUERY_STRING", "")
+    rsvp_success = None
+    if "rsvp_success=" in query_string:
+        try:
+            rsvp_success = urllib.parse.parse_qs(query_string)[
+                "rsvp_success"
+            ][0]
+        except:
+            pass
+
+    # Handle logged-in users
+    if user_id:
+        # Fetch user name and admin status
+        c.execute("SELECT name, is_admin FROM users WHERE id=?", (user_id,))
+        user_row = c.fetchone()
+        user_name = user_row[0] if user_row else "Guest"
+        is_admin = user_row[1] if user_row else False
+        # Fetch RSVP status and quantities
+        c.execute(
+            "SELECT rsvp, adults_qty, kids_qty FROM invites WHERE event_id=? AND user_id=?",
+            (event_id, user_id),
+        )
+        rsvp_row = c.fetchone()
+        rsvp_status = rsvp_row[0] if rsvp_row else None
+        adults_qty = rsvp_row[1] if rsvp_row else 1
+        kids_qty = rsvp_row[2] if rsvp_row else 0
+    else:
+        # Anonymous user viewing the event
+        user_name = "Guest"
+        is_admin = False
+        rsvp_status = (
+            rsvp_success  # Show success message if they just completed RSVP
+        )
+        adults_qty = 1
+        kids_qty = 0
+
+    # Everything else on the page is shared by all viewers in the same
+    # class, so a rendered copy can be reused until the event changes.
+    viewer = None
+    if rsvp_status in (None, "yes", "no"):
+        viewer_class = "admin" if is_admin else "user" if user_id else "anonymous"
+        viewer = (viewer_class, user_name, rsvp_status)
+        generation = get_page_generation(conn, event_id)
+        cached = get_cached_page(event_id, generation, viewer)
+        if cached is not None:
+            start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+            return [cached]
+
+    # Fetch event details
+    c.execute(
+        """SELECT title, description, host, datetime, location,
+                 registry1, registry2, header_image, version, updated_at
+                 FROM events WHERE id=?""",
+        (event_id,),
+    )
+    event = c.fetchone()
+    if not event:
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Event not found"]
+    (
+        title,
+        description,
+        host,
+        datetime_str,
+        location,
+        reg1,
+        reg2,
+        header_image,
+        version,
+        updated_at,
+    ) = event
+
+    # Generate calendar links
+    calendar_links = get_calendar_links(
+        event_id, version, updated_at, title, description, datetime_str, location
+    )
+
+    # Fetch comments
+    c.execute(
+        """SELECT comments.comment, 
+                        COALESCE(users.name, comments.comment_name) as display_name, 
+                        comments.timestamp
+                 FROM comments LEFT JOIN users ON comments.user_id = users.id
+                 WHERE comments.event_id=? ORDER BY comments.timestamp ASC""",
+        (event_id,),
+    )
+    raw_comments = c.fetchall()
+
+    # Format comments with readable timestamps
+    import datetime
+
+    comments = []
+    for comment_text, display_name, timestamp in raw_comments:
+        if timestamp:
+            try:
+                # Convert timestamp to readable format
+                dt = datetime.datetime.fromtimestamp(timestamp)
+                now = datetime.datetime.now()
+                diff = now - dt
+
+                if diff.days > 0:
+                    if diff.days == 1:
+                        time_ago = "1 day ago"
+                    else:
+                        time_ago = f"{diff.days} days ago"
+                elif diff.seconds > 3600:
+                    hours = diff.seconds // 3600
+                    if hours == 1:
+                        time_ago = "1 hour ago"
+                    else:
+                        time_ago = f"{hours} hours ago"
+                elif diff.seconds > 60:
+                    minutes = diff.seconds // 60
+                    if minutes == 1:
+                        time_ago = "1 minute ago"
+                    else:
+                        time_ago = f"{minutes} minutes ago"
+                else:
+                    time_ago = "just now"
+            except Exception:
+                time_ago = "recently"
+        else:
+            time_ago = "recently"
+
+        comments.append((comment_text, display_name, time_ago))
+
+    # Format date/time for display (timezone naive)
+    import datetime
+
+    try:
+        dt = datetime.datetime.fromisoformat(datetime_str)
+        date_display = dt.strftime("%A, %B %-d, %Y")
+        time_display = dt.strftime("%-I:%M %p")
+    except Exception:
+        date_display = datetime_str
+        time_display = ""
+    template = env.get_template("event.html")
+    body = template.render(
+        title=title,
+        description=description,
+        host=host,
+        date_display=date_display,
+        time_display=time_display,
+        location=location,
+        registry1=reg1,
+        registry2=reg2,
+        header_image=header_image,
+        user_name=user_name,
+        rsvp_status=rsvp_status,
+        comments=comments,
+        event_id=event_id,
+        is_admin=is_admin,
+        adults_qty=adults_qty,
+        kids_qty=kids_qty,
+        calendar_links=calendar_links,
+        host_feed_url=(
+            webcal_url(f"/calendar/host/{urllib.parse.quote(host)}") if host else None
+        ),
+        signed_in=bool(user_id),
+        base_url=BASE_URL,
+    )
+    body = body.encode("utf-8")
+    if viewer is not None:
+        cache_page(event_id, generation, viewer, body)
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body]
+
+
+@router.route("/event/<int>", methods=("POST",))
+def event_submit(environ, start_response, event_id):
+    """Handle an RSVP or comment posted from the event page."""
+    # Check if user is logged in (but don't require it)
+    user_id = get_user_from_session(environ)
+
+    params = parse_post(environ)
+    action = params.get("action", "")
+    conn = get_db()
+    c = conn.cursor()
+    if action == "rsvp":
+        response = params.get("response", "")
+        if response in ("yes", "no"):
+            if response == "yes":
+                # Get quantities for attending guests
+                adults_qty = int(params.get("adults_qty", 1))
+                kids_qty = int(params.get("kids_qty", 0))
+                dietary_restrictions = params.get(
+                    "dietary_restrictions", ""
+                ).strip()
+            else:
+                # For "no" response, clear quantities and dietary restrictions
+                adults_qty = 1
+                kids_qty = 0
+                dietary_restrictions = ""
+
+            # Upsert rather than INSERT OR REPLACE: a replace deletes the
+            # old row without firing delete triggers, which would leave
+            # the headcounts and guest search index out of step
+            c.execute(
+                """INSERT INTO invites 
+                         (event_id, user_id, rsvp, adults_qty, kids_qty, dietary_restrictions, is_anonymous)
+                         VALUES (?, ?, ?, ?, ?, ?, 0)
+                         ON CONFLICT(event_id, user_id) WHERE user_id IS NOT NULL DO UPDATE SET
+                         rsvp=excluded.rsvp, adults_qty=excluded.adults_qty,
+                         kids_qty=excluded.kids_qty,
+                         dietary_restrictions=excluded.dietary_restrictions,
+                         is_anonymous=0""",
+                (
+                    event_id,
+                    user_id,
+                    response,
+                    adults_qty,
+                    kids_qty,
+                    dietary_restrictions,
+                ),
+            )
+            conn.commit()
+            invalidate_event_pages(event_id)
+
+            # Get user details for email confirmation
+            c.execute(
+                "SELECT name, email FROM users WHERE id=?", (user_id,)
+            )
+            user_result = c.fetchone()
+            if user_result:
+                guest_name, guest_email = user_result
                 # Send confirmation emails
                 send_rsvp_confirmation_emails(
                     event_id,
                     guest_name,
                     guest_email,
-                    rsvp,
+                    response,
                     adults_qty,
                     kids_qty,
                     dietary_restrictions,
-                    is_anonymous=True,
+                    is_anonymous=False,
                 )
+    elif action == "comment":
+        # Get current user from session
+        current_user_id = get_user_from_session(environ)
+
+        comment_text = params.get("comment", "").strip()
+        comment_name = params.get("comment_name", "").strip()
+        print(
+            f"Debug: comment_text='{comment_text}', comment_name='{comment_name}', user_id={current_user_id}"
+        )
+        if comment_text and comment_name:
+            c.execute(
+                "INSERT INTO comments (event_id, user_id, comment, comment_name, timestamp) VALUES (?,?,?,?,?)",
+                (
+                    event_id,
+                    current_user_id,
+                    comment_text,
+                    comment_name,
+                    time.time(),
+                ),
+            )
+            conn.commit()
+            invalidate_event_pages(event_id)
+            print(f"Debug: Comment inserted for event {event_id}")
+        else:
+            print("Debug: Comment not inserted - missing text or name")
+    start_response("302 Found", [("Location", f"/event/{event_id}")])
+    return [b""]
+
+
+@router.route("/admin/event/<int>")
+def admin_event_page(environ, start_response, event_id):
+    """Show the event editor and RSVP tracking to an admin."""
+    denied = require_admin(environ, start_response)
+    if denied is not None:
+        return denied
+    conn = get_db()
+    c = conn.cursor()
+    # Fetch event details for editing
+    c.execute(
+        """SELECT id, title, description, host, datetime, location,
+                 registry1, registry2, header_image, card_theme FROM events WHERE id=?""",
+        (event_id,),
+    )
+    event_row = c.fetchone()
+    if not event_row:
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Event not found"]
+
+    # Convert to dict for template
+    event = {
+        "id": event_row[0],
+        "title": event_row[1],
+        "description": event_row[2] or "",
+        "host": event_row[3] or "",
+        "datetime": event_row[4] or "",
+        "location": event_row[5] or "",
+        "registry1": event_row[6] or "",
+        "registry2": event_row[7] or "",
+        "header_image": event_row[8] or "",
+        "card_theme": event_row[9] or "ocean",
+    }
+
+    # The first page of guests; the page fetches the rest as needed
+    guests, next_cursor = get_guest_page(conn, event_id)
+    rsvp_stats = get_rsvp_summary(conn, event_id)
+    invite_blast = get_latest_invite_blast(conn, event_id)
+    import_job = get_latest_import_job(conn, event_id)
+
+    template = env.get_template("admin.html")
+    body = template.render(
+        title="Admin - Edit Event",
+        event=event,
+        event_id=event_id,
+        guests=guests,
+        next_cursor=next_cursor,
+        rsvp_stats=rsvp_stats,
+        import_job=import_job,
+        invite_blast=invite_blast,
+        email_configured=email_configured(),
+    )
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body.encode("utf-8")]
+
+
+@router.route("/admin/event/<int>", methods=("POST",))
+def admin_event_submit(environ, start_response, event_id):
+    """Save an admin's edits to an event."""
+    denied = require_admin(environ, start_response)
+    if denied is not None:
+        return denied
+    # Handle event update
+    params = parse_post(environ)
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(
+        """UPDATE events SET 
+                 title=?, description=?, host=?, datetime=?, location=?,
+                 registry1=?, registry2=?, card_theme=? WHERE id=?""",
+        (
+            params.get("title", ""),
+            params.get("description", ""),
+            params.get("host", ""),
+            params.get("datetime", ""),
+            params.get("location", ""),
+            params.get("registry1", ""),
+            params.get("registry2", ""),
+            params.get("card_theme", "ocean"),
+            event_id,
+        ),
+    )
+    conn.commit()
+    invalidate_event_pages(event_id)
+    start_response("302 Found", [("Location", f"/event/{event_id}")])
+    return [b""]
+
+
+@router.route("/admin/import-csv/<int>", methods=("POST",))
+def import_csv(environ, start_response, event_id):
+    """Start importing a CSV guest list as anonymous invites."""
+    denied = require_admin(environ, start_response)
+    if denied is not None:
+        return denied
+    try:
+        reader = MultipartReader.from_environ(environ)
+    except ValueError:
+        start_response(
+            "400 Bad Request", [("Content-Type", "text/plain")]
+        )
+        return [b"Invalid content type"]
+
+    try:
+        # Save the uploaded file; the import itself runs in the background
+        upload = next((part for part in reader if part.name == "csv_file"), None)
+        if upload is None:
+            start_response(
+                "400 Bad Request", [("Content-Type", "text/plain")]
+            )
+            return [b"No file uploaded"]
+        start_import_job(event_id, upload, upload.filename or "upload.csv")
+    except ValueError:
+        start_response(
+            "400 Bad Request", [("Content-Type", "text/plain")]
+        )
+        return [b"Upload failed"]
+
+    start_response("302 Found", [("Location", f"/admin/event/{event_id}")])
+    return [b""]
+
+
+@router.route("/admin/import-jobs/<int>")
+def import_job_status(environ, start_response, job_id):
+    """Report an import job's progress as JSON for the admin page."""
+    denied = require_admin(environ, start_response)
+    if denied is not None:
+        return denied
+    job = get_import_job(get_db(), job_id)
+    if job is None:
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Import job not found"]
+    body = json.dumps(job).encode("utf-8")
+    start_response(
+        "200 OK",
+        [("Content-Type", "application/json"), ("Cache-Control", "no-store")],
+    )
+    return [body]
+
+
+@router.route("/admin/send-invites/<int>", methods=("POST",))
+def send_invites(environ, start_response, event_id):
+    """Start emailing invitations to an event's imported guests."""
+    denied = require_admin(environ, start_response)
+    if denied is not None:
+        return denied
+    # The admin page explains why nothing happens without SMTP
+    if email_configured():
+        start_invite_blast(event_id)
+    start_response("302 Found", [("Location", f"/admin/event/{event_id}")])
+    return [b""]
+
+
+@router.route("/admin/event/<int>/guests")
+def guest_list_api(environ, start_response, event_id):
+    """Return a page of an event's guest list as JSON.
+
+    Query parameters: status (all, yes, no or pending), q (search text),
+    cursor (from the previous page's next_cursor) and limit. The reply
+    includes the guests both as data and as rendered guest cards.
+    """
+    denied = require_admin(environ, start_response)
+    if denied is not None:
+        return denied
+    query = urllib.parse.parse_qs(environ.get("QUERY_STRING", ""))
+    try:
+        limit = max(1, min(int(query.get("limit", [GUEST_PAGE_SIZE])[0]), 500))
+        guests, next_cursor = get_guest_page(
+            get_db(),
+            event_id,
+            status=query.get("status", ["all"])[0],
+            search=query.get("q", [""])[0],
+            cursor=query.get("cursor", [None])[0],
+            limit=limit,
+        )
+    except ValueError:
+        start_response("400 Bad Request", [("Content-Type", "text/plain")])
+        return [b"Invalid guest list query"]
+    cards = env.get_template("guest_cards.html").render(guests=guests)
+    body = json.dumps(
+        {"guests": guests, "html": cards, "next_cursor": next_cursor}
+    ).encode("utf-8")
+    start_response(
+        "200 OK",
+        [("Content-Type", "application/json"), ("Cache-Control", "no-store")],
+    )
+    return [body]
+
+
+@router.route("/admin/event/<int>/export")
+def guest_export(environ, start_response, event_id):
+    """Stream an event's guest list as CSV (default) or JSON Lines."""
+    denied = require_admin(environ, start_response)
+    if denied is not None:
+        return denied
+    query = urllib.parse.parse_qs(environ.get("QUERY_STRING", ""))
+    fmt = query.get("format", ["csv"])[0]
+    if fmt not in EXPORT_FORMATS:
+        start_response("400 Bad Request", [("Content-Type", "text/plain")])
+        return [b"Unknown export format"]
+    if not get_db().execute("SELECT 1 FROM events WHERE id=?", (event_id,)).fetchone():
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Event not found"]
+    start_response(
+        "200 OK",
+        [
+            ("Content-Type", f"{EXPORT_FORMATS[fmt]}; charset=utf-8"),
+            ("Content-Disposition", f'attachment; filename="event-{event_id}-guests.{fmt}"'),
+            ("Cache-Control", "no-store"),
+        ],
+    )
+    return iter_guest_export(event_id, fmt)
+
+
+@router.route("/admin/event/<int>/headcount")
+def headcount_api(environ, start_response, event_id):
+    """Return an event's RSVP headcounts as JSON."""
+    denied = require_admin(environ, start_response)
+    if denied is not None:
+        return denied
+    summary = get_rsvp_summary(get_db(), event_id)
+    summary["total_guests"] = summary["total_adults"] + summary["total_kids"]
+    body = json.dumps({"event_id": event_id, **summary}).encode("utf-8")
+    start_response(
+        "200 OK",
+        [("Content-Type", "application/json"), ("Cache-Control", "no-store")],
+    )
+    return [body]
+
+
+@router.route("/admin/analytics/<int>")
+def click_analytics_page(environ, start_response, event_id):
+    """Show an admin how and when an event's invite links were clicked."""
+    denied = require_admin(environ, start_response)
+    if denied is not None:
+        return denied
+    conn = get_db()
+    event_row = conn.execute("SELECT title FROM events WHERE id=?", (event_id,)).fetchone()
+    if not event_row:
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Event not found"]
+
+    now = int(time.time())
+    series = {}
+    for bucket, label_format in (("hour", "%a %b %d, %I %p"), ("day", "%a %b %d")):
+        seconds = CLICK_ROLLUP_BUCKETS[bucket]
+        points = get_click_series(
+            conn,
+            event_id,
+            bucket,
+            now - seconds * CLICK_ANALYTICS_SPANS[bucket],
+            now + seconds,
+        )
+        peak = max((point["clicks"] for point in points), default=0)
+        for point in points:
+            point["label"] = time.strftime(label_format, time.localtime(point["start"]))
+            point["percent"] = round(100 * point["clicks"] / peak) if peak else 0
+        series[bucket] = points
+
+    template = env.get_template("analytics.html")
+    body = template.render(
+        title="Admin - Click Analytics",
+        event_title=event_row[0],
+        event_id=event_id,
+        totals=get_click_totals(conn, event_id),
+        hourly=series["hour"],
+        daily=series["day"],
+        leaders=get_click_leaders(conn, event_id),
+    )
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body.encode("utf-8")]
+
+
+@router.route("/admin/analytics/<int>/clicks")
+def click_analytics_api(environ, start_response, event_id):
+    """Return an event's click rollups as JSON.
+
+    Query parameters: bucket (hour or day), since and until (Unix
+    seconds), invite (an invite ID, or 0 for the whole event) and limit
+    (how many top guests to include).
+    """
+    denied = require_admin(environ, start_response)
+    if denied is not None:
+        return denied
+    query = urllib.parse.parse_qs(environ.get("QUERY_STRING", ""))
+    bucket = query.get("bucket", ["hour"])[0]
+    seconds = CLICK_ROLLUP_BUCKETS.get(bucket)
+    try:
+        if seconds is None:
+            raise ValueError(bucket)
+        until = int(query.get("until", [int(time.time()) + seconds])[0])
+        since = int(query.get("since", [until - seconds * CLICK_ANALYTICS_SPANS[bucket]])[0])
+        invite_id = int(query.get("invite", ["0"])[0])
+        limit = min(int(query.get("limit", ["20"])[0]), 500)
+    except ValueError:
+        start_response("400 Bad Request", [("Content-Type", "text/plain")])
+        return [b"Invalid analytics query"]
+
+    conn = get_db()
+    body = json.dumps(
+        {
+            "event_id": event_id,
+            "bucket": bucket,
+            "invite_id": invite_id,
+            "since": since,
+            "until": until,
+            "series": get_click_series(conn, event_id, bucket, since, until, invite_id),
+            "totals": get_click_totals(conn, event_id),
+            "top_guests": get_click_leaders(conn, event_id, limit),
+        }
+    ).encode("utf-8")
+    start_response(
+        "200 OK",
+        [("Content-Type", "application/json"), ("Cache-Control", "no-store")],
+    )
+    return [body]
 
-                # Redirect back to event page with success message
-                start_response(
-                    "302 Found",
-                    [("Location", f"/event/{event_id}?rsvp_success={rsvp}")],
-                )
-                return [b""]
 
+@router.route("/anonymous-rsvp/<int>")
+def anonymous_rsvp_page(environ, start_response, event_id):
+    """Show the anonymous RSVP form, prefilled from the invite link."""
+    # Show anonymous RSVP form
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(
+        """SELECT title, description, host, datetime, location,
+                 registry1, registry2, header_image, version, updated_at
+                 FROM events WHERE id=?""",
+        (event_id,),
+    )
+    event = c.fetchone()
+
+    if not event:
         start_response("404 Not Found", [("Content-Type", "text/plain")])
-        return [b"Anonymous RSVP not found"]
+        return [b"Event not found"]
+
+    (
+        title,
+        description,
+        host,
+        datetime_str,
+        location,
+        reg1,
+        reg2,
+        header_image,
+        version,
+        updated_at,
+    ) = event
+
+    # Generate calendar links
+    calendar_links = get_calendar_links(
+        event_id, version, updated_at, title, description, datetime_str, location
+    )
+
+    # Format date/time for display
+    import datetime
+
+    try:
+        dt = datetime.datetime.fromisoformat(datetime_str)
+        date_display = dt.strftime("%A, %B %-d, %Y")
+        time_display = dt.strftime("%-I:%M %p")
+    except Exception:
+        date_display = datetime_str
+        time_display = ""
+
+    # Parse URL parameters for pre-filling
+    query_string = environ.get("QUERY_STRING", "")
+    url_params = urllib.parse.parse_qs(query_string)
+    prefill_name = (
+        url_params.get("name", [""])[0] if "name" in url_params else ""
+    )
+    prefill_phone = (
+        url_params.get("phone", [""])[0] if "phone" in url_params else ""
+    )
+    prefill_email = (
+        url_params.get("email", [""])[0] if "email" in url_params else ""
+    )
+
+    # Track invite click if phone number is provided
+    if prefill_phone:
+        track_invite_click(event_id, prefill_phone, environ)
+
+    template = env.get_template("anonymous_rsvp.html")
+    body = template.render(
+        title=title,
+        description=description,
+        host=host,
+        date_display=date_display,
+        time_display=time_display,
+        location=location,
+        registry1=reg1,
+        registry2=reg2,
+        header_image=header_image,
+        event_id=event_id,
+        guest_name=prefill_name,
+        guest_phone=prefill_phone,
+        guest_email=prefill_email,
+        error=None,
+        calendar_links=calendar_links,
+        base_url=BASE_URL,
+        is_anonymous_link=True,
+        current_url=f"{BASE_URL}/anonymous-rsvp/{event_id}",
+    )
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [body.encode("utf-8")]
+
+
+@router.route("/anonymous-rsvp/<int>", methods=("POST",))
+def anonymous_rsvp_submit(environ, start_response, event_id):
+    """Record an RSVP from a guest without an account."""
+    # Handle anonymous RSVP submission
+    params = parse_post(environ)
+    guest_name = params.get("guest_name", "").strip()
+    guest_email = params.get("guest_email", "").strip()
+    guest_phone = params.get("guest_phone", "").strip()
+    rsvp = params.get("rsvp", "")
+    dietary_restrictions = params.get("dietary_restrictions", "").strip()
+    adults_qty = (
+        int(params.get("adults_qty", 1)) if params.get("adults_qty") else 1
+    )
+    kids_qty = (
+        int(params.get("kids_qty", 0)) if params.get("kids_qty") else 0
+    )
+
+    # Check for duplicates by phone number
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(
+        "SELECT id, guest_name FROM invites WHERE event_id=? AND guest_phone=? AND is_anonymous=1",
+        (event_id, guest_phone),
+    )
+    existing_rsvp = c.fetchone()
+
+    if existing_rsvp:
+        # Phone number already used - update existing RSVP
+        conn = get_db()
+        c = conn.cursor()
+        c.execute(
+            """UPDATE invites SET guest_name=?, guest_email=?, rsvp=?, adults_qty=?, kids_qty=?, dietary_restrictions=?
+                     WHERE event_id=? AND guest_phone=? AND is_anonymous=1""",
+            (
+                guest_name,
+                guest_email,
+                rsvp,
+                adults_qty,
+                kids_qty,
+                dietary_restrictions,
+                event_id,
+                guest_phone,
+            ),
+        )
+        conn.commit()
+        invalidate_event_pages(event_id)
+
+        # Send confirmation emails for the update
+        send_rsvp_confirmation_emails(
+            event_id,
+            guest_name,
+            guest_email,
+            rsvp,
+            adults_qty,
+            kids_qty,
+            dietary_restrictions,
+            is_anonymous=True,
+        )
+
+        # Redirect back to event page with success message
+        start_response(
+            "302 Found",
+            [("Location", f"/event/{event_id}?rsvp_success={rsvp}")],
+        )
+        return [b""]
+
+    if not guest_name or not guest_phone or rsvp not in ("yes", "no"):
+        # Show form with error
+        conn = get_db()
+        c = conn.cursor()
+        c.execute(
+            """SELECT title, description, host, datetime, location,
+                     registry1, registry2, header_image, version, updated_at
+                     FROM events WHERE id=?""",
+            (event_id,),
+        )
+        event = c.fetchone()
+
+        if event:
+            (
+                title,
+                description,
+                host,
+                datetime_str,
+                location,
+                reg1,
+                reg2,
+                header_image,
+                version,
+                updated_at,
+            ) = event
+            calendar_links = get_calendar_links(
+                event_id,
+                version,
+                updated_at,
+                title,
+                description,
+                datetime_str,
+                location,
+            )
+
+            # Format date/time
+            import datetime
 
-    if path.startswith("/rsvp-thanks/"):
-        segments = path.strip("/").split("/")
-        if len(segments) == 2:
             try:
-                event_id = int(segments[1])
-            except ValueError:
-                start_response("404 Not Found", [("Content-Type", "text/plain")])
-                return [b"Event not found"]
-
-            # Simple thank you message
-            thank_you_html = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <title>Thank You</title>
-                <link rel="preconnect" href="https://fonts.googleapis.com">
-                <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
-                <link href="https://fonts.googleapis.com/css2?family=Playfair+Display:ital,wght@0,400;0,600;1,400&family=Crimson+Text:ital,wght@0,400;0,600;1,400&display=swap" rel="stylesheet">
-                <link rel="stylesheet" href="/static/css/style.css">
-            </head>
-            <body>
-                <div class="container">
-                    <div class="event-card">
-                        <h2>Thank You!</h2>
-                        <p class="description">Your RSVP has been received. We appreciate you letting us know!</p>
-                        <p>We're looking forward to celebrating with you.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
-            return [thank_you_html.encode("utf-8")]
+                dt = datetime.datetime.fromisoformat(datetime_str)
+                date_display = dt.strftime("%A, %B %-d, %Y")
+                time_display = dt.strftime("%-I:%M %p")
+            except Exception:
+                date_display = datetime_str
+                time_display = ""
+
+            template = env.get_template("anonymous_rsvp.html")
+            body = template.render(
+                title=title,
+                description=description,
+                host=host,
+                date_display=date_display,
+                time_display=time_display,
+                location=location,
+                registry1=reg1,
+                registry2=reg2,
+                header_image=header_image,
+                event_id=event_id,
+                error="Please fill in your name, phone number, and select an RSVP option.",
+                calendar_links=calendar_links,
+                base_url=BASE_URL,
+                is_anonymous_link=True,
+            )
+            start_response(
+                "200 OK", [("Content-Type", "text/html; charset=utf-8")]
+            )
+            return [body.encode("utf-8")]
 
-    # Unknown path
-    start_response("404 Not Found", [("Content-Type", "text/plain")])
-    return [b"Not Found"]
+    # Save anonymous RSVP
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(
+        """INSERT INTO invites (event_id, guest_name, guest_email, guest_phone, rsvp, adults_qty, kids_qty, dietary_restrictions, is_anonymous)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+                 ON CONFLICT(event_id, guest_phone) WHERE is_anonymous = 1 DO UPDATE SET
+                 guest_name=excluded.guest_name, guest_email=excluded.guest_email,
+                 rsvp=excluded.rsvp, adults_qty=excluded.adults_qty, kids_qty=excluded.kids_qty,
+                 dietary_restrictions=excluded.dietary_restrictions""",
+        (
+            event_id,
+            guest_name,
+            guest_email,
+            guest_phone,
+            rsvp,
+            adults_qty,
+            kids_qty,
+            dietary_restrictions,
+        ),
+    )
+    conn.commit()
+    invalidate_event_pages(event_id)
+
+    # Send confirmation emails
+    send_rsvp_confirmation_emails(
+        event_id,
+        guest_name,
+        guest_email,
+        rsvp,
+        adults_qty,
+        kids_qty,
+        dietary_restrictions,
+        is_anonymous=True,
+    )
+
+    # Redirect back to event page with success message
+    start_response(
+        "302 Found",
+        [("Location", f"/event/{event_id}?rsvp_success={rsvp}")],
+    )
+    return [b""]
+
+
+@router.route("/rsvp-thanks/<int>", methods=("GET", "POST"))
+def rsvp_thanks(environ, start_response, event_id):
+    """Show a simple thank-you page."""
+    # Simple thank you message
+    thank_you_html = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>Thank You</title>
+        <link rel="preconnect" href="https://fonts.googleapis.com">
+        <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
+        <link href="https://fonts.googleapis.com/css2?family=Playfair+Display:ital,wght@0,400;0,600;1,400&family=Crimson+Text:ital,wght@0,400;0,600;1,400&display=swap" rel="stylesheet">
+        <link rel="stylesheet" href="{static_url('css/style.css')}">
+    </head>
+    <body>
+        <div class="container">
+            <div class="event-card">
+                <h2>Thank You!</h2>
+                <p class="description">Your RSVP has been received. We appreciate you letting us know!</p>
+                <p>We're looking forward to celebrating with you.</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+    start_response("200 OK", [("Content-Type", "text/html; charset=utf-8")])
+    return [thank_you_html.encode("utf-8")]
 
 
 # -------------------------------------------------------------------
-# Main entry point
+# WSGI application
 
-if __name__ == "__main__":
-    # Ensure necessary directories exist
+
+def application(environ, start_response):
+    """WSGI entry point: handle the request, then release the database."""
+    try:
+        return _compress_response(environ, start_response, handle_request)
+    finally:
+        release_db()
+
+
+def handle_request(environ, start_response):
+    """Dispatch an incoming HTTP request to its handler."""
+    setup_testing_defaults(environ)
+    path = environ.get("PATH_INFO", "")
+    method = environ.get("REQUEST_METHOD", "GET").upper()
+
+    match = router.match(path)
+    if match is None:
+        start_response("404 Not Found", [("Content-Type", "text/plain")])
+        return [b"Not Found"]
+
+    handlers, args = match
+    handler = handlers.get(method)
+    if handler is None:
+        start_response(
+            "405 Method Not Allowed",
+            [("Content-Type", "text/plain"), ("Allow", ", ".join(sorted(handlers)))],
+        )
+        return [b"Method Not Allowed"]
+    return handler(environ, start_response, *args)
+
+
+# -------------------------------------------------------------------
+# Server lifecycle
+
+# These hooks are shared by the built-in server below and by the
+# gunicorn configuration in gunicorn.conf.py. prepare_app() runs once,
+# before any request is served; the background workers are started in
+# every serving process, since threads do not survive a fork.
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    """wsgiref server that handles each request on its own thread."""
+
+    daemon_threads = True
+
+
+def prepare_app() -> None:
+    """Create directories, migrate the database and warm assets and templates."""
     os.makedirs(TEMPLATES_DIR, exist_ok=True)
     os.makedirs(os.path.join(STATIC_DIR, "css"), exist_ok=True)
     os.makedirs(os.path.join(STATIC_DIR, "images"), exist_ok=True)
-    # Initialise the database on startup
     init_db()
+    drifted = check_rsvp_summary(get_db())
+    if drifted:
+        print(f"[DB] RSVP headcounts out of step for events {drifted}; recounting")
+        rebuild_rsvp_summary(get_db())
+    preload_static_assets()
+    precompile_templates()
+
+
+def start_background_workers(stale_after: float = INVITE_BLAST_STALE_SECONDS) -> None:
+    """Start this process's outbox worker and resume interrupted blasts."""
+    start_email_worker()
+    resume_invite_blasts(stale_after=stale_after)
+
+
+def shutdown_background_workers() -> None:
+    """Stop this process's workers and close its pooled connections."""
+    stop_email_worker()
+    stop_click_flusher()
+    close_smtp_pool()
+    close_db_connections()
+
+
+# -------------------------------------------------------------------
+# ASGI application
+
+# asgi_application serves the same routes from an asyncio event loop,
+# e.g. ``uvicorn invite_app:asgi_application``. Connections are held by
+# the loop, so idle keep-alive guests cost no thread; only a request
+# that is being handled occupies one of the ASGI_EXECUTOR_THREADS
+# threads that run the (SQLite and Jinja bound) WSGI handlers. Email is
+# never sent from a request: it is queued for the outbox worker.
+# Request bodies larger than ASGI_SPOOL_BYTES are spooled to disk.
+ASGI_EXECUTOR_THREADS = int(os.environ.get("ASGI_EXECUTOR_THREADS", "16"))
+ASGI_SPOOL_BYTES = int(os.environ.get("ASGI_SPOOL_BYTES", str(1024 * 1024)))
+
+_asgi_executor: ThreadPoolExecutor | None = None
+_asgi_executor_lock = threading.Lock()
+
+
+def _get_asgi_executor() -> ThreadPoolExecutor:
+    global _asgi_executor
+    with _asgi_executor_lock:
+        if _asgi_executor is None:
+            _asgi_executor = ThreadPoolExecutor(
+                max_workers=ASGI_EXECUTOR_THREADS, thread_name_prefix="asgi"
+            )
+        return _asgi_executor
+
+
+def _asgi_environ(scope: dict, body) -> dict:
+    """Build a WSGI environ for an ASGI HTTP request."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[name] = value
+            continue
+        key = "HTTP_" + name
+        if key in environ:
+            separator = "; " if key == "HTTP_COOKIE" else ", "
+            value = environ[key] + separator + value
+        environ[key] = value
+    return environ
+
+
+async def _asgi_http(scope: dict, receive, send) -> None:
+    loop = asyncio.get_running_loop()
+    executor = _get_asgi_executor()
+    with tempfile.SpooledTemporaryFile(max_size=ASGI_SPOOL_BYTES) as body:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.write(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        body.seek(0)
+        environ = _asgi_environ(scope, body)
+        response = {}
+        written = []
+
+        def start_response(status, headers, exc_info=None):
+            response["status"] = int(status.split(" ", 1)[0])
+            response["headers"] = [
+                (name.lower().encode("latin-1"), value.strip().encode("latin-1"))
+                for name, value in headers
+            ]
+            return written.append
+
+        result = await loop.run_in_executor(
+            executor, application, environ, start_response
+        )
+        chunks = iter(result)
+        streamed = not isinstance(result, list)
+
+        async def next_chunk():
+            # Most handlers return a list; only streamed files need the
+            # executor to produce each chunk.
+            if streamed:
+                return await loop.run_in_executor(executor, next, chunks, None)
+            return next(chunks, None)
+
+        try:
+            chunk = await next_chunk()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": response["status"],
+                    "headers": response["headers"],
+                }
+            )
+            for data in written:
+                await send({"type": "http.response.body", "body": data, "more_body": True})
+            while chunk is not None:
+                if chunk:
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+                chunk = await next_chunk()
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                await loop.run_in_executor(executor, close)
+
+
+def _asgi_startup() -> None:
+    prepare_app()
+    start_background_workers()
+
+
+def _asgi_shutdown() -> None:
+    global _asgi_executor
+    with _asgi_executor_lock:
+        executor, _asgi_executor = _asgi_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    shutdown_background_workers()
+
+
+async def _asgi_lifespan(receive, send) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                await loop.run_in_executor(None, _asgi_startup)
+            except Exception as exc:
+                await send({"type": "lifespan.startup.failed", "message": str(exc)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await loop.run_in_executor(None, _asgi_shutdown)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def asgi_application(scope, receive, send):
+    """ASGI entry point serving the same routes as ``application``."""
+    if scope["type"] == "http":
+        await _asgi_http(scope, receive, send)
+    elif scope["type"] == "lifespan":
+        await _asgi_lifespan(receive, send)
+    else:
+        raise ValueError(f"Unsupported ASGI scope type: {scope['type']}")
+
+
+# -------------------------------------------------------------------
+# Main entry point
+
+if __name__ == "__main__":
+    # For development. In production run gunicorn with gunicorn.conf.py,
+    # which serves requests from several processes.
+    prepare_app()
+    # Deliver any email left queued by a previous run
+    start_background_workers(stale_after=0)
     # Determine port from environment or default to 8000
     port = int(os.environ.get("PORT", "8000"))
-    with make_server("", port, application) as httpd:
+    with make_server("", port, application, server_class=ThreadingWSGIServer) as httpd:
         print(f"Serving on port {port}... (Ctrl+C to stop)")
         print(f"Visit: {BASE_URL}")
         try:
             httpd.serve_forever()
         except KeyboardInterrupt:
             print("Shutting down.")
+        finally:
+            shutdown_background_workers()